@@ -1,27 +1,96 @@
+import os
+import logging
 from aqt import mw, gui_hooks
 from aqt.utils import qconnect
 from aqt.qt import QAction
 
-from .ui import SonaveebDialog
-from .sonaveeb import Sonaveeb
-from .notetypes import NoteTypeManager
+from .globals import (
+    USER_FILES_DIR,
+    LOOKUP_CACHE_TTL,
+    LOOKUP_CACHE_MAX_PAGES,
+    LOOKUP_CACHE_MAX_AGE,
+)
+
+
+# Only the menu action is registered at Anki launch. The scraper, note type
+# manager, indices and UI modules (along with requests and bs4) are loaded
+# when the dialog is opened for the first time.
+
+
+def init_services():
+    '''Create shared addon services on first use.'''
+    global sonaveeb, notetype_manager, pivot_index, note_index, lemma_index, completion_index
+    global lookup_cache
+    if sonaveeb is not None:
+        return
+    from .cache import LookupCache
+    from .sonaveeb import Sonaveeb
+    from .notetypes import NoteTypeManager
+    from .pivot import PivotIndex
+    from .lemma import LemmaIndex
+    from .completion import CompletionIndex
+    from .note_index import NoteIndex
+    # The cache may be large, so it's loaded in background, like the note index
+    lookup_cache = LookupCache(
+        os.path.join(USER_FILES_DIR, 'cache'),
+        ttl=LOOKUP_CACHE_TTL,
+        max_pages=LOOKUP_CACHE_MAX_PAGES,
+        max_age=LOOKUP_CACHE_MAX_AGE,
+        load=False,
+    )
+    mw.taskman.run_in_background(lookup_cache.load, _on_lookup_cache_loaded)
+    sonaveeb = Sonaveeb(cache=lookup_cache)
+    notetype_manager = NoteTypeManager()
+    pivot_index = PivotIndex(os.path.join(USER_FILES_DIR, 'pivot_index.json'))
+    note_index = NoteIndex()
+    lemma_index = LemmaIndex(os.path.join(USER_FILES_DIR, 'lemma_index.json'))
+    completion_index = CompletionIndex(os.path.join(USER_FILES_DIR, 'search_history.json'))
+
+
+def _on_lookup_cache_loaded(future):
+    if (error := future.exception()) is not None:
+        logging.error(f'Failed to load lookup cache: {error}')
 
 
 def open_sonaveeb_dialog():
     global window
     if window is None:
-        window = SonaveebDialog(notetype_manager, sonaveeb)
+        from .ui import SonaveebDialog
+        init_services()
+        window = SonaveebDialog(
+            notetype_manager, sonaveeb, pivot_index, note_index, lemma_index, completion_index
+        )
     window.show()
 
 
 def destroy_sonaveeb_dialog():
     global window
-    window = None
+    if window is not None:
+        window.cleanup()
+        window.close()
+        window = None
+    if pivot_index is not None:
+        from .tracing import tracer
+        from .netstats import netstats
+        tracer.finish()
+        netstats.quota_callbacks.clear()
+        netstats.offline_callbacks.clear()
+        pivot_index.save()
+        lemma_index.save()
+        completion_index.save()
+        lookup_cache.save()
+    if note_index is not None:
+        note_index.clear()
 
 
 window = None
-sonaveeb = Sonaveeb()
-notetype_manager = NoteTypeManager()
+sonaveeb = None
+notetype_manager = None
+pivot_index = None
+note_index = None
+lemma_index = None
+completion_index = None
+lookup_cache = None
 
 action = QAction("Sõnaveeb Deck Builder", mw)
 qconnect(action.triggered, open_sonaveeb_dialog)
@@ -1,19 +1,27 @@
-from typing import List, Optional
+from typing import Callable, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import shutil
 import tempfile
 import logging
+import threading
 import requests
 
 from aqt import mw
 from aqt.sound import av_player
 
+from .globals import AUDIO_DOWNLOAD_WORKERS
+from .tracing import tracer
+from .netstats import netstats
+
 
 class AudioManager:
     '''Manages audio operations for word pronunciations.'''
     def __init__(self, request_timeout=None):
         self._request_timeout = request_timeout
         self._cache = {}
+        # Audio may be prefetched and saved from different threads
+        self._lock = threading.Lock()
 
     def __del__(self):
         self.cleanup()
@@ -34,39 +42,48 @@ class AudioManager:
             Path to a downloaded audio file.
 
         '''
-        if url in self._cache:
-            # Audio file is cached
-            cached_path, is_temporary = self._cache[url]
-            logging.debug(f'Audio is cached: {cached_path} (temporary: {is_temporary})')
-            # If different target path is requested,
-            # move or copy the file and update cache
-            if filepath is not None and filepath != cached_path:
+        with self._lock:
+            if url in self._cache:
+                # Audio file is cached
+                cached_path, is_temporary = self._cache[url]
+                netstats.record_cache_hit(url)
+                logging.debug(f'Audio is cached: {cached_path} (temporary: {is_temporary})')
+                # If different target path is requested,
+                # move or copy the file and update cache
+                if filepath is not None and filepath != cached_path:
+                    if is_temporary:
+                        shutil.move(cached_path, filepath)
+                    else:
+                        shutil.copy(cached_path, filepath)
+                    cached_path = filepath
+                    self._cache[url] = (cached_path, False)
+                    logging.debug(f'Cache updated: {cached_path} (temporary: {False})')
+            else:
+                logging.debug('Cache is missing, downloading audio file')
+                # Cache is missing, download the file
+                netstats.check(url)
+                try:
+                    with tracer.span('audio.download'):
+                        response = requests.get(url, timeout=self._request_timeout)
+                except requests.RequestException:
+                    netstats.record_request(url, failed=True)
+                    raise
+                netstats.record_request(url, len(response.content), error=not response.ok)
+                response.raise_for_status()
+                # Create target file
+                is_temporary = filepath is None
                 if is_temporary:
-                    shutil.move(cached_path, filepath)
+                    file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
                 else:
-                    shutil.copy(cached_path, filepath)
-                cached_path = filepath
-                self._cache[url] = (cached_path, False)
-                logging.debug(f'Cache updated: {cached_path} (temporary: {False})')
-        else:
-            logging.debug('Cache is missing, downloading audio file')
-            # Cache is missing, download the file
-            response = requests.get(url, timeout=self._request_timeout)
-            response.raise_for_status()
-            # Create target file
-            is_temporary = filepath is None
-            if is_temporary:
-                file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-            else:
-                file = open(filepath, 'wb')
-            cached_path = Path(file.name)
-            # Save content
-            with file as f:
-                f.write(response.content)
-            # Update cache
-            self._cache[url] = (cached_path, is_temporary)
-            logging.debug(f'Cache updated: {cached_path} (temporary: {is_temporary})')
-        return cached_path
+                    file = open(filepath, 'wb')
+                cached_path = Path(file.name)
+                # Save content
+                with file as f:
+                    f.write(response.content)
+                # Update cache
+                self._cache[url] = (cached_path, is_temporary)
+                logging.debug(f'Cache updated: {cached_path} (temporary: {is_temporary})')
+            return cached_path
 
     def save(self, urls: List[str], word: str, word_id: int) -> List[str]:
         '''Downloads audio files into Anki media directory.
@@ -95,3 +112,20 @@ class AudioManager:
                 except Exception:
                     logging.error(f'Unable to remove temporary audio file: {filepath}')
         self._cache.clear()
+
+
+def run_audio_jobs(jobs: List[Callable[[], None]], max_workers: int = AUDIO_DOWNLOAD_WORKERS) -> List[Exception]:
+    '''Run audio jobs concurrently in a bounded thread pool.
+
+    Returns a list of errors raised by the failed jobs.
+    '''
+    if not jobs:
+        return []
+    errors = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = [executor.submit(job) for job in jobs]
+        for future in futures:
+            if (error := future.exception()) is not None:
+                logging.error(f'Failed to save audio: {error}')
+                errors.append(error)
+    return errors
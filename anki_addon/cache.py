@@ -0,0 +1,269 @@
+'''
+Local cache of Sõnaveeb pages and of entries parsed from them.
+
+Raw pages are kept compressed on disk, one file per URL, so that parsed
+entries can be rebuilt locally whenever the parser changes (see
+scripts/reparse_cache.py). Parsed entries are kept in a single file in
+the binary formats of `WordInfo.to_bytes`, `references_to_bytes` and
+`base_forms_to_bytes`.
+'''
+
+import os
+import gzip
+import json
+import time
+import marshal
+import hashlib
+import logging
+import threading
+import typing as tp
+import dataclasses as dc
+
+
+PAGES_DIR = 'pages'
+PAGES_INDEX = 'pages.json'
+ENTRIES_FILE = 'entries.bin'
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+class PageKind:
+    '''Kinds of cached pages, each parsed into its own kind of entry.'''
+    FORMS = 'forms'
+    SEARCH = 'search'
+    DETAILS = 'details'
+
+
+@dc.dataclass
+class CachedPage:
+    url: str
+    kind: str
+    file: str
+    fetched_at: float
+    etag: tp.Optional[str] = None
+    last_modified: tp.Optional[str] = None
+    # To tell whether a page has changed if the server sends no validators
+    content_hash: tp.Optional[str] = None
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def validators(self) -> tp.Dict[str, str]:
+        '''Headers for a conditional request of the page.'''
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class LookupCache:
+    '''Cached Sõnaveeb pages and parsed entries, keyed by page URL.
+
+    Pages are written to disk as soon as they are stored, the page index
+    and the entries are written by `save`. The oldest pages are evicted
+    along with their entries once there are too many of them, or once
+    they are older than `max_age`.
+
+    Args:
+        directory: Cache directory.
+        ttl: Time in seconds after which cached entries are considered stale,
+            None means they never are.
+        max_pages: Maximum number of cached pages, None means unlimited.
+        max_age: Time in seconds after which cached pages are evicted,
+            None means they never are.
+        load: Whether to load the cache from disk right away. Otherwise
+            `load` is expected to be called later, e.g. in background.
+    '''
+    def __init__(
+            self,
+            directory: str,
+            ttl: tp.Optional[float] = None,
+            max_pages: tp.Optional[int] = None,
+            max_age: tp.Optional[float] = None,
+            load: bool = True):
+        self._directory = directory
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self.max_age = max_age
+        self._pages: tp.Dict[str, CachedPage] = {}
+        # URL -> serialized entry
+        self._entries: tp.Dict[str, bytes] = {}
+        self._pages_dirty = False
+        self._entries_dirty = False
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        if load:
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def pages(self) -> tp.List[CachedPage]:
+        with self._lock:
+            return list(self._pages.values())
+
+    def get_page(self, url: str) -> tp.Optional[CachedPage]:
+        with self._lock:
+            return self._pages.get(url)
+
+    def read_page(self, page: CachedPage) -> bytes:
+        '''Raw content of a cached page.'''
+        with open(os.path.join(self._directory, PAGES_DIR, page.file), 'rb') as file:
+            return gzip.decompress(file.read())
+
+    def put_page(self, url: str, kind: str, content: bytes, headers: tp.Mapping[str, str] = None):
+        '''Store a fetched page along with its validators.'''
+        headers = headers or {}
+        name = f'{hashlib.sha1(url.encode()).hexdigest()}.html.gz'
+        path = os.path.join(self._directory, PAGES_DIR, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(gzip.compress(content))
+        page = CachedPage(
+            url=url,
+            kind=kind,
+            file=name,
+            fetched_at=time.time(),
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            content_hash=content_hash(content),
+        )
+        with self._lock:
+            self._pages[url] = page
+            self._pages_dirty = True
+
+    def touch_page(self, url: str):
+        '''Mark a cached page as fresh, e.g. once it was revalidated.'''
+        with self._lock:
+            if page := self._pages.get(url):
+                page.fetched_at = time.time()
+                self._pages_dirty = True
+
+    def is_fresh(self, url: str) -> bool:
+        '''Whether the page is cached and younger than the TTL.'''
+        page = self.get_page(url)
+        return page is not None and (self.ttl is None or page.age() <= self.ttl)
+
+    def get_entry(self, url: str) -> tp.Optional[bytes]:
+        with self._lock:
+            return self._entries.get(url)
+
+    def get_fresh_entry(self, url: str) -> tp.Optional[bytes]:
+        '''Cached entry, unless its page is older than the TTL.'''
+        return self.get_entry(url) if self.is_fresh(url) else None
+
+    def put_entry(self, url: str, data: bytes):
+        with self._lock:
+            if self._entries.get(url) != data:
+                self._entries[url] = data
+                self._entries_dirty = True
+
+    def remove_entry(self, url: str):
+        '''Drop a parsed entry, e.g. one that can't be deserialized anymore.'''
+        with self._lock:
+            if self._entries.pop(url, None) is not None:
+                self._entries_dirty = True
+
+    def replace_entries(self, entries: tp.Dict[str, bytes]):
+        '''Replace all parsed entries, e.g. after re-parsing the pages.'''
+        with self._lock:
+            self._entries = dict(entries)
+            self._entries_dirty = True
+
+    def evict(self):
+        '''Remove pages over the size and age limits, along with their entries.'''
+        with self._lock:
+            pages = sorted(self._pages.values(), key=lambda p: p.fetched_at, reverse=True)
+            if self.max_pages is not None:
+                evicted = pages[self.max_pages:]
+                pages = pages[:self.max_pages]
+            else:
+                evicted = []
+            if self.max_age is not None:
+                evicted += [p for p in pages if p.age() > self.max_age]
+            for page in evicted:
+                del self._pages[page.url]
+                self._entries.pop(page.url, None)
+            if evicted:
+                self._pages_dirty = True
+                self._entries_dirty = True
+        for page in evicted:
+            try:
+                os.remove(os.path.join(self._directory, PAGES_DIR, page.file))
+            except OSError as e:
+                logging.warning(f'Failed to remove cached page {page.file}: {e}')
+        if evicted:
+            logging.info(f'Evicted {len(evicted)} pages from lookup cache')
+
+    def load(self):
+        '''Load the page index and entries from disk once, and evict old pages.
+
+        Pages and entries stored before loading are kept.
+        '''
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            # Files are read independently, so that a missing or corrupted
+            # entries file doesn't orphan the cached pages, and vice versa
+            pages = self._read(PAGES_INDEX, self._read_pages) or {}
+            entries = self._read(ENTRIES_FILE, self._read_entries) or {}
+            with self._lock:
+                self._pages = {**pages, **self._pages}
+                self._entries = {**entries, **self._entries}
+            self.evict()
+
+    def save(self):
+        '''Save the page index and entries to disk, whichever has changed.'''
+        # Don't overwrite the files with the data stored before loading only
+        self.load()
+        with self._lock:
+            pages = entries = None
+            if self._pages_dirty:
+                pages = {url: dc.asdict(page) for url, page in self._pages.items()}
+            if self._entries_dirty:
+                entries = dict(self._entries)
+            self._pages_dirty = False
+            self._entries_dirty = False
+        if pages is None and entries is None:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        if pages is not None:
+            with open(os.path.join(self._directory, PAGES_INDEX), 'w', encoding='utf-8') as file:
+                json.dump(pages, file, ensure_ascii=False)
+        if entries is not None:
+            with open(os.path.join(self._directory, ENTRIES_FILE), 'wb') as file:
+                marshal.dump(entries, file)
+
+    def _read(self, name: str, read: tp.Callable[[str], tp.Any]) -> tp.Any:
+        # Result of reading the file, or None if it's missing or invalid
+        path = os.path.join(self._directory, name)
+        try:
+            return read(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError) as e:
+            logging.error(f'Failed to load lookup cache {name}: {e}')
+            return None
+
+    @staticmethod
+    def _read_pages(path: str) -> tp.Dict[str, CachedPage]:
+        with open(path, 'r', encoding='utf-8') as file:
+            return {url: CachedPage(**page) for url, page in json.load(file).items()}
+
+    @staticmethod
+    def _read_entries(path: str) -> tp.Dict[str, bytes]:
+        with open(path, 'rb') as file:
+            entries = marshal.load(file)
+        if not isinstance(entries, dict):
+            raise ValueError(f'unexpected {type(entries).__name__}')
+        return entries
@@ -0,0 +1,184 @@
+'''
+Prefix completion of known words for the search box.
+
+Words are kept in a packed sorted array: all words are joined into a
+single string, with their offsets and usage counts in typed arrays, so
+hundreds of thousands of words take a few megabytes and a prefix lookup
+is a binary search. The best completions of short prefixes, which match
+too many words to rank on every keystroke, are precomputed.
+'''
+
+import os
+import json
+import array
+import heapq
+import logging
+import typing as tp
+from collections import Counter
+
+
+# Prefixes up to this length that match more than PRECOMPUTED_RANGE
+# words have their completions precomputed
+PRECOMPUTED_PREFIX_LENGTH = 3
+PRECOMPUTED_RANGE = 256
+COMPLETIONS_LIMIT = 10
+# Sorts after any character that may follow a prefix
+_MAX_CHAR = '\U0010ffff'
+
+
+class PackedWords:
+    '''Immutable array of words sorted case-insensitively, with usage counts.'''
+    def __init__(self, counts: tp.Dict[str, int], limit: int = COMPLETIONS_LIMIT):
+        words = sorted(counts, key=lambda w: (w.lower(), w))
+        self._text = ''.join(words)
+        self._offsets = array.array('I', [0])
+        for word in words:
+            self._offsets.append(self._offsets[-1] + len(word))
+        self._counts = array.array('I', (counts[w] for w in words))
+        self._limit = limit
+        # Prefix -> indices of the best completions
+        self._top = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            self._precompute(length)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def word(self, index: int) -> str:
+        return self._text[self._offsets[index]:self._offsets[index + 1]]
+
+    def count(self, word: str) -> int:
+        '''Usage count of the word, 0 if unknown.'''
+        index = self._lower_bound(word.lower())
+        while index < len(self) and self.word(index).lower() == word.lower():
+            if self.word(index) == word:
+                return self._counts[index]
+            index += 1
+        return 0
+
+    def top(self, prefix: str, limit: tp.Optional[int] = None) -> tp.List[tp.Tuple[str, int]]:
+        '''The most used words starting with the prefix, as (word, count) pairs.'''
+        limit = limit or self._limit
+        prefix = prefix.lower()
+        indices = self._top.get(prefix) if limit <= self._limit else None
+        if indices is None:
+            start, end = self._range(prefix)
+            indices = self._best(start, end, limit)
+        return [(self.word(i), self._counts[i]) for i in indices[:limit]]
+
+    def _lower_bound(self, key: str) -> int:
+        # Index of the first word not less than the lowercase key
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word(mid).lower() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _range(self, prefix: str) -> tp.Tuple[int, int]:
+        return self._lower_bound(prefix), self._lower_bound(prefix + _MAX_CHAR)
+
+    def _best(self, start: int, end: int, limit: int) -> tp.List[int]:
+        # Ties are kept in alphabetical order
+        return heapq.nlargest(limit, range(start, end), key=self._counts.__getitem__)
+
+    def _precompute(self, length: int):
+        index = 0
+        while index < len(self):
+            prefix = self.word(index).lower()[:length]
+            if len(prefix) < length:
+                # Longer words starting with this one follow it
+                index += 1
+                continue
+            end = self._lower_bound(prefix + _MAX_CHAR)
+            if end - index > PRECOMPUTED_RANGE:
+                self._top[prefix] = self._best(index, end, self._limit)
+            index = end
+
+
+class CompletionIndex:
+    '''Completions from known words, ranked by how often they were used.
+
+    Known words are packed by `build`, which is meant to run in background
+    when completions are needed for the first time. Words used since then
+    are kept aside and merged into results.
+    '''
+    def __init__(self, path: tp.Optional[str] = None):
+        self._path = path
+        self._loaded = False
+        # Searched queries -> number of searches
+        self._usage = Counter()
+        # Usage since the words were packed
+        self._recent = Counter()
+        self._packed: tp.Optional[PackedWords] = None
+        self._dirty = False
+
+    @property
+    def ready(self) -> bool:
+        return self._packed is not None
+
+    def record(self, word: str):
+        '''Count a use of the word, e.g. a successful search.'''
+        self._usage[word] += 1
+        self._recent[word] += 1
+        self._dirty = True
+
+    def build(self, words: tp.Iterable[tp.Tuple[str, int]]) -> PackedWords:
+        '''Pack known words along with searched queries, e.g. in background.
+
+        Args:
+            words: (word, count) pairs, a word may be repeated.
+
+        Returns:
+            Packed words to pass to `set_packed`.
+        '''
+        self.load()
+        counts = Counter(self._usage)
+        for word, count in words:
+            counts[word] += count
+        return PackedWords(counts)
+
+    def set_packed(self, packed: PackedWords):
+        self._packed = packed
+        self._recent.clear()
+
+    def complete(self, prefix: str, limit: int = COMPLETIONS_LIMIT) -> tp.List[str]:
+        '''The most used known words starting with the prefix.'''
+        prefix = prefix.strip()
+        if not prefix or self._packed is None:
+            return []
+        counts = dict(self._packed.top(prefix, limit))
+        lower = prefix.lower()
+        for word, count in self._recent.items():
+            if word.lower().startswith(lower):
+                counts[word] = self._packed.count(word) + count
+        ranked = sorted(counts, key=lambda w: (-counts[w], w.lower()))
+        return [w for w in ranked if w != prefix][:limit]
+
+    def load(self):
+        '''Load usage counts from disk, once.'''
+        if self._loaded:
+            return
+        self._loaded = True
+        if self._path is None or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r', encoding='utf-8') as file:
+                usage = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f'Failed to load search history: {e}')
+            return
+        # Keep uses recorded before loading
+        self._usage = Counter(usage) + self._usage
+
+    def save(self):
+        '''Save usage counts to disk if anything changed.'''
+        if self._path is None or not self._dirty:
+            return
+        self.load()
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'w', encoding='utf-8') as file:
+            json.dump(self._usage, file, ensure_ascii=False)
+        self._dirty = False
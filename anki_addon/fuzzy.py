@@ -0,0 +1,112 @@
+'''
+Fuzzy matching of locally known words.
+
+Words are compared after folding Estonian diacritics (õ, ö, ä, ü, š, ž),
+so that words typed without an Estonian keyboard layout still match. Near
+matches are found via an inverted index of letter bigrams, and verified
+by edit distance.
+'''
+
+import unicodedata
+import typing as tp
+from collections import defaultdict, Counter
+
+
+def fold(word: str) -> str:
+    '''Lowercase the word and strip diacritics, e.g. "Õun" -> "oun".'''
+    decomposed = unicodedata.normalize('NFD', word.strip().lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def edit_distance(a: str, b: str) -> int:
+    '''Levenshtein distance between two strings.'''
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def bigrams(key: str) -> tp.Set[str]:
+    '''Distinct letter pairs of the word, including its start and end.'''
+    padded = f'^{key}$'
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class FuzzyIndex:
+    '''Diacritic-tolerant fuzzy index of known words.
+
+    Each indexed word points to a target to suggest, e.g. inflected forms
+    point to their base form.
+    '''
+    def __init__(self):
+        # Folded words, and their targets at the same positions
+        self._words = []
+        self._targets = []
+        self._positions = {}
+        # Bigram -> positions of words that contain it
+        self._postings = defaultdict(list)
+
+    def __len__(self):
+        return len(self._words)
+
+    def add(self, word: str, target: tp.Optional[str] = None):
+        key = fold(word)
+        if not key:
+            return
+        if (position := self._positions.get(key)) is None:
+            position = self._positions[key] = len(self._words)
+            self._words.append(key)
+            self._targets.append(set())
+            for bigram in bigrams(key):
+                self._postings[bigram].append(position)
+        self._targets[position].add(target or word)
+
+    def update(self, pairs: tp.Iterable[tp.Tuple[str, str]]):
+        '''Add (word, target) pairs.'''
+        for word, target in pairs:
+            self.add(word, target)
+
+    def search(self, query: str, max_distance: tp.Optional[int] = None, limit: int = 5) -> tp.List[str]:
+        '''Targets of words similar to the query, the closest first.
+
+        Args:
+            query: Word as typed.
+            max_distance: Maximum edit distance after folding diacritics,
+                by default 1 for words up to 4 letters and 2 for longer ones.
+            limit: Maximum number of suggestions.
+        '''
+        key = fold(query)
+        if not key:
+            return []
+        if max_distance is None:
+            max_distance = 1 if len(key) <= 4 else 2
+        # Each edit changes at most two bigrams, so words within the distance
+        # share at least this many bigrams with the query
+        query_bigrams = bigrams(key)
+        min_shared = max(len(query_bigrams) - 2 * max_distance, 1)
+        shared = Counter()
+        for bigram in query_bigrams:
+            shared.update(self._postings.get(bigram, ()))
+        ranked = {}
+        for position, count in shared.items():
+            word = self._words[position]
+            if count < min_shared or abs(len(word) - len(key)) > max_distance:
+                continue
+            distance = edit_distance(key, word)
+            if distance > max_distance:
+                continue
+            for target in self._targets[position]:
+                rank = (distance, abs(len(target) - len(query)), target)
+                if target not in ranked or rank < ranked[target]:
+                    ranked[target] = rank
+        ranked.pop(query.strip().lower(), None)
+        return sorted(ranked, key=ranked.get)[:limit]
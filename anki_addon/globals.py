@@ -1,4 +1,24 @@
+import os
+
+
 REQUEST_TIMEOUT = 5
 TRANSLATIONS_LIMIT = 3
 EXAMPLES_LIMIT = 3
 LEXEMES_LIMIT = 3
+AUDIO_DOWNLOAD_WORKERS = 4
+# Soft network quotas per session, after which only cached data is used
+NETWORK_REQUEST_QUOTA = 1000
+NETWORK_BYTES_QUOTA = 100 * 1024 * 1024
+# Consecutive failed requests after which offline mode is enabled
+OFFLINE_FAILURE_THRESHOLD = 3
+# Milliseconds between connectivity checks in automatic offline mode
+OFFLINE_PROBE_INTERVAL = 30 * 1000
+# Milliseconds between fetches of lookups queued while offline
+OFFLINE_FETCH_INTERVAL = 2 * 1000
+# Age after which cached Sõnaveeb entries are fetched again
+LOOKUP_CACHE_TTL = 30 * 24 * 60 * 60
+# Limits after which the oldest cached Sõnaveeb pages are evicted. Stale
+# pages are still used offline, so they are kept much longer than the TTL.
+LOOKUP_CACHE_MAX_PAGES = 50000
+LOOKUP_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+USER_FILES_DIR = os.path.join(os.path.dirname(__file__), 'user_files')
@@ -1,50 +1,130 @@
 import os
-import bs4
+import re
+import html
 import requests
 import typing as tp
+import urllib.parse
 from collections import Counter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+try:
+    from .tracing import tracer
+    from .netstats import netstats
+except ImportError:
+    # Imported as a standalone module, e.g. from scripts
+    from tracing import tracer
+    from netstats import netstats
 
-URL = 'https://translate.google.com/m?tl={target_lang}&sl={source_lang}&q={text}'
 
+URL = 'https://translate.google.com/m'
 
-def translate(text: str, target_lang: str = 'en', source_lang: str = 'et', timeout: float = None, debug: bool = False):
-    '''Translate text with Google Translate.'''
-    # GET request to google translate does not requrie authentication
-    url = URL.format(target_lang=target_lang, source_lang=source_lang, text=text)
-    resp = requests.get(url, timeout=timeout)
-    if resp.status_code != 200:
-        raise RuntimeError(f'Request failed: {resp.status_code}')
-    dom = bs4.BeautifulSoup(resp.text, 'html.parser')
-    if debug:
-        open(os.path.join('debug', f'gtranslate_{text}.html'), 'w').write(dom.prettify())
-    if result := dom.find('div', class_='result-container'):
-        result = result.string
-    return result
+# The mobile page contains a single result element with plain text inside,
+# so there's no need to build a whole DOM tree just to read it.
+RESULT_REGEX = re.compile(
+    r'<div[^>]*\bclass="result-container"[^>]*>(.*?)</div>',
+    re.DOTALL
+)
+TAG_REGEX = re.compile(r'<[^>]+>')
 
 
-def cross_translate(sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None):
-    '''Find the most suitable common translations for multiple synonyms.
+def extract_result(page: str) -> tp.Optional[str]:
+    '''Extract translation result text from Google Translate mobile page.'''
+    if match := RESULT_REGEX.search(page):
+        return html.unescape(TAG_REGEX.sub('', match.group(1)))
+    return None
+
 
-    Translate a list of synonyms from multiple source languages into a single target language,
-    sort translations by frequency of their repetition, and filter the most popular ones.
+class GoogleTranslator:
+    '''Google Translate client.
 
-    Args:
-        source: pairs of source language code and a list of input words in that language.
-        lang: target translation language.
+    Keeps a persistent session, so that consecutive requests reuse pooled
+    connections, and retries transient failures with a backoff. Results are
+    kept for the session, so repeated lookups work offline as well.
     '''
-    translations = []
-    for source_lang, words in sources.items():
-        text = ', '.join(words)
-        translation = translate(
-            text=text,
-            target_lang=lang,
-            source_lang=source_lang,
-            timeout=timeout
+    def __init__(self, retries: int = 2, pool_size: int = 4):
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET'],
         )
-        translations += [t.strip() for t in translation.lower().split(',')]
-    counted = Counter(translations)
-    threshold = min(len(sources), max(counted.values()))
-    ordered = sorted(counted.items(), key=lambda x: x[1], reverse=True)
-    filtered = [k for k, v in ordered if v >= threshold]
-    return filtered
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        # (text, source_lang, target_lang) -> translation
+        self._results = {}
+
+    def translate(self, text: str, target_lang: str = 'en', source_lang: str = 'et', timeout: float = None, debug: bool = False):
+        '''Translate text with Google Translate.'''
+        # GET request to google translate does not requrie authentication
+        params = dict(tl=target_lang, sl=source_lang, q=text)
+        url = f'{URL}?{urllib.parse.urlencode(params)}'
+        key = (text, source_lang, target_lang)
+        if key in self._results:
+            netstats.record_cache_hit(url)
+            return self._results[key]
+        netstats.check(url)
+        try:
+            with tracer.span('gtranslate.request'):
+                resp = self.session.get(url, timeout=timeout)
+        except requests.RequestException:
+            netstats.record_request(url, failed=True)
+            raise
+        netstats.record_request(url, len(resp.content), error=resp.status_code != 200)
+        if resp.status_code != 200:
+            raise RuntimeError(f'Request failed: {resp.status_code}')
+        if debug:
+            open(os.path.join('debug', f'gtranslate_{text}.html'), 'w').write(resp.text)
+        with tracer.span('gtranslate.extract'):
+            result = extract_result(resp.text)
+        if result is not None:
+            self._results[key] = result
+        return result
+
+    def cross_translate(self, sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None):
+        '''Find the most suitable common translations for multiple synonyms.
+
+        Translate a list of synonyms from multiple source languages into a single target language,
+        sort translations by frequency of their repetition, and filter the most popular ones.
+
+        Args:
+            source: pairs of source language code and a list of input words in that language.
+            lang: target translation language.
+        '''
+        translations = []
+        for source_lang, words in sources.items():
+            text = ', '.join(words)
+            translation = self.translate(
+                text=text,
+                target_lang=lang,
+                source_lang=source_lang,
+                timeout=timeout
+            )
+            translations += [t.strip() for t in translation.lower().split(',')]
+        counted = Counter(translations)
+        threshold = min(len(sources), max(counted.values()))
+        ordered = sorted(counted.items(), key=lambda x: x[1], reverse=True)
+        filtered = [k for k, v in ordered if v >= threshold]
+        return filtered
+
+
+_default_translator = None
+
+
+def default_translator() -> GoogleTranslator:
+    '''Shared translator instance, created on first use.'''
+    global _default_translator
+    if _default_translator is None:
+        _default_translator = GoogleTranslator()
+    return _default_translator
+
+
+def translate(text: str, target_lang: str = 'en', source_lang: str = 'et', timeout: float = None, debug: bool = False):
+    '''Translate text with the shared Google Translate client.'''
+    return default_translator().translate(text, target_lang, source_lang, timeout, debug)
+
+
+def cross_translate(sources: tp.Dict[str, tp.List[str]], lang: str, timeout: float = None):
+    '''Find the most suitable common translations with the shared Google Translate client.'''
+    return default_translator().cross_translate(sources, lang, timeout)
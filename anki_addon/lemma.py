@@ -0,0 +1,102 @@
+import os
+import json
+import logging
+import typing as tp
+from collections import defaultdict
+
+from .sonaveeb import WordInfo
+
+
+def _normalize(word: str) -> str:
+    return word.strip().lower()
+
+
+class LemmaIndex:
+    '''Offline base form resolution based on previously seen Sõnaveeb paradigms.
+
+    Every word details page lists the morphological paradigm of the word, so
+    its inflected forms can be resolved to the base form without asking
+    Sõnaveeb. The index maps each normalized form to (base_form, word_id)
+    pairs of the words it was seen in.
+    '''
+    def __init__(self, path: tp.Optional[str] = None):
+        self._path = path
+        # Raw paradigms per word: word_id -> [base_form, [forms]]
+        self._words = {}
+        # Normalized form -> list of (base_form, word_id)
+        self._index = defaultdict(list)
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._words)
+
+    def add(self, word_info: WordInfo):
+        '''Index all forms of the word.'''
+        if word_info.word is None or word_info.word_id is None or word_info.word_id in self._words:
+            # Nothing to index, or already indexed
+            return
+        forms = [word_info.word]
+        for value in word_info.morphology.values():
+            # Some forms have variants, e.g. long and short mitmuse osastav
+            forms.extend(v for v in value.split(',') if v.strip() not in ('', '-', '–'))
+        self._words[word_info.word_id] = [word_info.word, forms]
+        self._index_word(word_info.word_id, word_info.word, forms)
+        self._dirty = True
+
+    def lookup(self, form: str) -> tp.List[tp.Tuple[str, str]]:
+        '''Known words the form belongs to.
+
+        Returns:
+            List of (base_form, word_id) tuples, empty if the form wasn't seen.
+        '''
+        return list(self._index.get(_normalize(form), []))
+
+    def base_forms(self, form: str) -> tp.List[str]:
+        '''Distinct base forms the form belongs to, in the order they were seen.'''
+        return list(dict.fromkeys(base for base, _word_id in self.lookup(form)))
+
+    def words(self) -> tp.List[str]:
+        '''Base forms of all indexed words.'''
+        return [base_form for base_form, _forms in list(self._words.values())]
+
+    def forms(self, start: int = 0) -> tp.List[tp.Tuple[str, str]]:
+        '''(form, base_form) pairs of indexed words.
+
+        Args:
+            start: Number of words to skip. Words are only appended, so
+                this allows to get forms of words indexed since then.
+        '''
+        return [
+            (form, base_form)
+            for base_form, forms in list(self._words.values())[start:]
+            for form in forms
+        ]
+
+    def load(self):
+        '''Load indexed paradigms from disk.'''
+        try:
+            with open(self._path, 'r', encoding='utf-8') as file:
+                words = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f'Failed to load lemma index: {e}')
+            return
+        for word_id, (base_form, forms) in words.items():
+            self._words[word_id] = [base_form, forms]
+            self._index_word(word_id, base_form, forms)
+        self._dirty = False
+
+    def save(self):
+        '''Save indexed paradigms to disk if anything changed.'''
+        if self._path is None or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'w', encoding='utf-8') as file:
+            json.dump(self._words, file, ensure_ascii=False)
+        self._dirty = False
+
+    def _index_word(self, word_id: str, base_form: str, forms: tp.List[str]):
+        entry = (base_form, word_id)
+        for form in dict.fromkeys(_normalize(f) for f in forms):
+            self._index[form].append(entry)
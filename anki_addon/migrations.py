@@ -0,0 +1,55 @@
+import typing as tp
+
+from anki.collection import Collection, OpChangesWithCount
+from anki.notes import Note, NoteId
+from aqt import mw
+
+from .sonaveeb import canonical_word_url
+from .note_index import WORD_ID_FIELD, URL_FIELD
+
+
+def migrate_note(note: Note) -> bool:
+    '''Convert legacy URL to the current format and fill in missing Word ID.
+
+    Returns:
+        True if the note was modified.
+    '''
+    if URL_FIELD not in note:
+        return False
+    canonical = canonical_word_url(note[URL_FIELD])
+    if canonical is None:
+        return False
+    url, word_id = canonical
+    modified = False
+    if note[URL_FIELD] != url:
+        note[URL_FIELD] = url
+        modified = True
+    if WORD_ID_FIELD in note and not note[WORD_ID_FIELD].strip():
+        note[WORD_ID_FIELD] = word_id
+        modified = True
+    return modified
+
+
+def migrate_legacy_notes(col: Collection, note_ids: tp.Sequence[NoteId]) -> OpChangesWithCount:
+    '''Migrate notes created by older addon versions in a single undoable step.
+
+    Intended to run as a background collection operation.
+    '''
+    total = len(note_ids)
+    notes = []
+    for i, nid in enumerate(note_ids):
+        if i % 100 == 0:
+            mw.taskman.run_on_main(
+                lambda i=i: mw.progress.update(
+                    label=f'Migrating Sõnaveeb notes: {i}/{total}',
+                    value=i,
+                    max=total,
+                )
+            )
+        note = col.get_note(nid)
+        if migrate_note(note):
+            notes.append(note)
+    undo_entry = col.add_custom_undo_entry('Migrate Sõnaveeb Notes')
+    col.update_notes(notes)
+    changes = col.merge_undo_entries(undo_entry)
+    return OpChangesWithCount(count=len(notes), changes=changes)
@@ -0,0 +1,185 @@
+'''
+Network usage accounting with soft quotas.
+
+Requests, transferred bytes, cache hits and errors are counted per host,
+both per search and per session. Once a session quota is exceeded, the
+addon switches to cache-only mode, in which network requests are refused
+and only cached data is used.
+
+Offline mode refuses network requests as well. It is enabled by the user,
+or automatically after several consecutive failed requests to the main host.
+'''
+
+import threading
+import urllib.parse
+import typing as tp
+import dataclasses as dc
+from collections import defaultdict
+
+
+class NetworkRefused(RuntimeError):
+    '''Network request refused, only cached data may be used.'''
+
+
+class QuotaExceeded(NetworkRefused):
+    '''Network request refused in cache-only mode.'''
+
+
+class Offline(NetworkRefused):
+    '''Network request refused in offline mode.'''
+
+
+@dc.dataclass
+class HostStats:
+    requests: int = 0
+    bytes: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+
+
+def _host(url: str) -> str:
+    return urllib.parse.urlsplit(url).netloc
+
+
+def _total(stats: tp.Dict[str, HostStats]) -> HostStats:
+    total = HostStats()
+    for host_stats in stats.values():
+        for field in dc.fields(HostStats):
+            setattr(total, field.name, getattr(total, field.name) + getattr(host_stats, field.name))
+    return total
+
+
+def format_bytes(value: int) -> str:
+    if value < 1024:
+        return f'{value} B'
+    if value < 1024 ** 2:
+        return f'{value / 1024:.1f} KB'
+    return f'{value / 1024 ** 2:.1f} MB'
+
+
+class NetStats:
+    '''Network usage counters for the session and the current search.'''
+    def __init__(self):
+        self.session = defaultdict(HostStats)
+        self.search = defaultdict(HostStats)
+        # Session quotas, None means unlimited
+        self.request_quota: tp.Optional[int] = None
+        self.bytes_quota: tp.Optional[int] = None
+        self.cache_only = False
+        # Session totals when the quotas were last reset
+        self._baseline = HostStats()
+        # Called without arguments when cache-only mode is enabled due to a quota
+        self.quota_callbacks = []
+        self.offline = False
+        # Whether offline mode was enabled due to failed requests
+        self.offline_automatically = False
+        # Consecutive failed requests to the host after which offline mode is enabled,
+        # None means never. Failures of other hosts, e.g. translations, don't count.
+        self.failure_threshold: tp.Optional[int] = None
+        self.failure_host: tp.Optional[str] = None
+        self._consecutive_failures = 0
+        # Called without arguments when offline mode is enabled due to failed requests
+        self.offline_callbacks = []
+        self._lock = threading.Lock()
+
+    def set_quotas(self, requests: tp.Optional[int], bytes: tp.Optional[int]):
+        self.request_quota = requests
+        self.bytes_quota = bytes
+
+    def set_offline(self, offline: bool):
+        '''Enable or disable offline mode manually.'''
+        with self._lock:
+            self.offline = offline
+            self.offline_automatically = False
+            self._consecutive_failures = 0
+
+    def network_allowed(self) -> bool:
+        return not self.cache_only and not self.offline
+
+    def begin_search(self):
+        '''Reset per-search counters.'''
+        with self._lock:
+            self.search = defaultdict(HostStats)
+
+    def check(self, url: str):
+        '''Raise NetworkRefused if network requests aren't allowed.'''
+        if self.offline:
+            raise Offline(f'Offline mode, not requesting {_host(url)}')
+        if self.cache_only:
+            raise QuotaExceeded(f'Network quota exceeded, not requesting {_host(url)}')
+
+    def record_request(self, url: str, size: int = 0, error: bool = False, failed: bool = False):
+        '''Account a network request and the size of its response.
+
+        Args:
+            error: The request failed or returned an error status.
+            failed: No response was received, e.g. due to a connection error or timeout.
+        '''
+        host = _host(url)
+        with self._lock:
+            for stats in [self.session[host], self.search[host]]:
+                stats.requests += 1
+                stats.bytes += size
+                stats.errors += int(error or failed)
+            exceeded = not self.cache_only and self._is_quota_exceeded()
+            if exceeded:
+                self.cache_only = True
+            if host == self.failure_host:
+                self._consecutive_failures = self._consecutive_failures + 1 if failed else 0
+            went_offline = (
+                not self.offline
+                and self.failure_threshold is not None
+                and self._consecutive_failures >= self.failure_threshold
+            )
+            if went_offline:
+                self.offline = True
+                self.offline_automatically = True
+        if exceeded:
+            for callback in self.quota_callbacks:
+                callback()
+        if went_offline:
+            for callback in self.offline_callbacks:
+                callback()
+
+    def record_cache_hit(self, url: str):
+        '''Account a request served from a cache.'''
+        host = _host(url)
+        with self._lock:
+            self.session[host].cache_hits += 1
+            self.search[host].cache_hits += 1
+
+    def resume(self):
+        '''Leave cache-only mode, and count quotas from now on.'''
+        with self._lock:
+            self.cache_only = False
+            self._baseline = _total(self.session)
+
+    def totals(self) -> tp.Tuple[HostStats, HostStats]:
+        '''Counters summed over all hosts for the current search and the session.'''
+        with self._lock:
+            return _total(self.search), _total(self.session)
+
+    def summary(self) -> str:
+        '''Human-readable per-host summary.'''
+        with self._lock:
+            lines = []
+            for title, per_host in [('Search', self.search), ('Session', self.session)]:
+                lines.append(f'{title}:')
+                for host, stats in sorted(per_host.items()):
+                    lines.append(
+                        f'  {host}: {stats.requests} requests, {format_bytes(stats.bytes)},'
+                        f' {stats.cache_hits} cache hits, {stats.errors} errors'
+                    )
+            return '\n'.join(lines)
+
+    def _is_quota_exceeded(self) -> bool:
+        total = _total(self.session)
+        requests = total.requests - self._baseline.requests
+        size = total.bytes - self._baseline.bytes
+        return (
+            (self.request_quota is not None and requests > self.request_quota)
+            or (self.bytes_quota is not None and size > self.bytes_quota)
+        )
+
+
+netstats = NetStats()
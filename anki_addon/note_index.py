@@ -0,0 +1,337 @@
+import logging
+import typing as tp
+import dataclasses as dc
+from collections import defaultdict
+
+from anki import hooks
+from anki.notes import Note, NoteId
+from anki.utils import ids2str
+from aqt import mw, gui_hooks
+from aqt.editor import Editor
+from aqt.operations import QueryOp
+
+from .sonaveeb import WordInfo, legacy_url_key, canonical_word_url
+
+
+WORD_ID_FIELD = 'Word ID'
+URL_FIELD = 'URL'
+
+
+@dc.dataclass
+class IndexedNote:
+    word_id: str
+    url: str
+    legacy_key: tp.Optional[tuple]
+    deck_ids: tp.Set[int] = dc.field(default_factory=set)
+    # Whether URL is in a legacy format or Word ID is missing
+    outdated: bool = False
+
+    @classmethod
+    def from_fields(cls, word_id: str, url: str, deck_ids: tp.Iterable[int] = ()):
+        canonical = canonical_word_url(url)
+        outdated = canonical is not None and (canonical[0] != url or not word_id.strip())
+        return cls(word_id, url, legacy_url_key(url), set(deck_ids), outdated)
+
+    @classmethod
+    def from_note(cls, note: Note, deck_ids: tp.Iterable[int]):
+        word_id = note[WORD_ID_FIELD] if WORD_ID_FIELD in note else ''
+        url = note[URL_FIELD] if URL_FIELD in note else ''
+        return cls.from_fields(word_id, url, deck_ids)
+
+
+class NoteKeyMap:
+    '''Maps Word ID, URL and normalized legacy URL key to note IDs.'''
+    def __init__(self, notes: tp.Dict[NoteId, IndexedNote] = None):
+        self.notes = {}
+        self._by_word_id = defaultdict(set)
+        self._by_url = defaultdict(set)
+        self._by_legacy_key = defaultdict(set)
+        for nid, entry in (notes or {}).items():
+            self.insert(nid, entry)
+
+    def __len__(self):
+        return len(self.notes)
+
+    def insert(self, nid: NoteId, entry: IndexedNote):
+        self.remove(nid)
+        self.notes[nid] = entry
+        if entry.word_id:
+            self._by_word_id[entry.word_id.strip().lower()].add(nid)
+        if entry.url:
+            self._by_url[entry.url.strip().lower()].add(nid)
+        if entry.legacy_key is not None:
+            self._by_legacy_key[entry.legacy_key].add(nid)
+
+    def remove(self, nid: NoteId) -> tp.Optional[IndexedNote]:
+        entry = self.notes.pop(nid, None)
+        if entry is not None:
+            self._by_word_id[entry.word_id.strip().lower()].discard(nid)
+            self._by_url[entry.url.strip().lower()].discard(nid)
+            if entry.legacy_key is not None:
+                self._by_legacy_key[entry.legacy_key].discard(nid)
+        return entry
+
+    def find(self, word_info: WordInfo, deck_ids: tp.Set[int]) -> tp.Optional[NoteId]:
+        '''Find a note for the word in any of the decks.
+
+        Notes are matched by Word ID first, then by URL, then by legacy URL.
+        '''
+        candidates = [
+            self._by_word_id.get(word_info.word_id.lower(), ()),
+            self._by_url.get(word_info.url.lower(), ()),
+        ]
+        if key := word_info.legacy_url_key():
+            candidates.append(self._by_legacy_key.get(key, ()))
+            # Older URLs may lack the language suffix
+            candidates.append(self._by_legacy_key.get(key[:2] + (None,), ()))
+        for note_ids in candidates:
+            matching = [nid for nid in note_ids if self.notes[nid].deck_ids & deck_ids]
+            if matching:
+                return min(matching)
+        return None
+
+    def find_many(self, word_infos: tp.List[WordInfo], deck_ids: tp.Set[int]) -> tp.Dict[str, NoteId]:
+        '''Find notes for multiple words in any of the decks.
+
+        Returns:
+            Mapping from word ID to note ID for the words that have notes.
+        '''
+        found = {}
+        for info in word_infos:
+            if (nid := self.find(info, deck_ids)) is not None:
+                found[info.word_id] = nid
+        return found
+
+
+def search_notes(
+        col,
+        word_infos: tp.List[WordInfo],
+        deck_id: int,
+        legacy: bool = True) -> tp.Dict[str, NoteId]:
+    '''Find notes for multiple words in the deck with a single collection search.
+
+    Args:
+        legacy: Whether to match legacy URL variants too, which requires a
+            slower regex search. Only unnecessary once no notes have them.
+
+    Returns:
+        Mapping from word ID to note ID for the words that have notes.
+    '''
+    if not word_infos:
+        return {}
+    deck = col.decks.get(deck_id)['name']
+    # Legacy URLs are migrated only if the user agrees (see migrations.py),
+    # so they may remain in notes
+    terms = []
+    for info in word_infos:
+        terms += [
+            f'"{WORD_ID_FIELD}:{info.word_id}"',
+            f'{URL_FIELD}:"{info.url}"',
+        ]
+        if legacy:
+            terms.append(f'"{URL_FIELD}:re:{info.legacy_url_regex()}"')
+    note_ids = col.find_notes(f'({" OR ".join(terms)}) deck:"{deck}"')
+    # Match found notes back to the words
+    key_map = NoteKeyMap({
+        nid: IndexedNote.from_note(col.get_note(nid), [deck_id])
+        for nid in note_ids
+    })
+    return key_map.find_many(word_infos, {deck_id})
+
+
+class NoteIndex:
+    '''In-memory index of existing notes that refer to Sõnaveeb words.
+
+    Allows checking whether notes exist without collection searches.
+    It is built in the background once per collection, and kept current
+    via Anki hooks. Changes that hooks don't report, e.g. cards moved
+    between decks, mark it outdated, and it's rebuilt on the next use.
+    '''
+    def __init__(self):
+        self.ready = False
+        # Called without arguments every time the index is (re)built
+        self.ready_callbacks = []
+        self._building = False
+        # Whether the collection has changed during the current build
+        self._stale = False
+        # Whether the collection has changed since the last build
+        self._outdated = False
+        # Incremented whenever the collection is closed, to ignore outdated builds
+        self._generation = 0
+        self._pending_added = []
+        self._key_map = NoteKeyMap()
+        hooks.note_will_be_added.append(self._on_note_will_be_added)
+        hooks.note_will_flush.append(self._on_note_will_flush)
+        hooks.notes_will_be_deleted.append(self._on_notes_will_be_deleted)
+        gui_hooks.operation_did_execute.append(self._on_operation_did_execute)
+        gui_hooks.sync_did_finish.append(self.invalidate)
+
+    def __len__(self):
+        return len(self._key_map)
+
+    def ensure_built(self):
+        '''Build the index in the background, unless it's up to date or being built.'''
+        if not self._building and (not self.ready or self._outdated):
+            self.build()
+
+    def build(self):
+        '''(Re)build the index in the background.'''
+        if self._building:
+            # Rebuild once the current build is finished
+            self._stale = True
+            return
+        self._building = True
+        self._stale = False
+        self._pending_added.clear()
+        generation = self._generation
+        QueryOp(
+            parent=mw,
+            op=self._read_collection,
+            success=lambda notes: self._on_built(notes, generation)
+        ).failure(self._on_build_error).run_in_background()
+
+    def invalidate(self):
+        '''Mark the index outdated, so that it's rebuilt on the next use.'''
+        if self._building:
+            self._stale = True
+        elif self.ready:
+            self._outdated = True
+
+    def clear(self):
+        '''Drop all indexed data and callbacks, e.g. when the collection is closed.'''
+        self.ready = False
+        self.ready_callbacks.clear()
+        self._building = False
+        self._stale = False
+        self._outdated = False
+        self._generation += 1
+        self._pending_added.clear()
+        self._key_map = NoteKeyMap()
+
+    def find(self, word_info: WordInfo, deck_id: int) -> tp.Optional[NoteId]:
+        '''Find a note for the word in the deck or its subdecks.'''
+        return self.find_many([word_info], deck_id).get(word_info.word_id)
+
+    def find_many(self, word_infos: tp.List[WordInfo], deck_id: int) -> tp.Dict[str, NoteId]:
+        '''Find notes for multiple words in the deck or its subdecks.
+
+        Uses the index if it's up to date, otherwise a single collection
+        search while the index is rebuilt.
+
+        Returns:
+            Mapping from word ID to note ID for the words that have notes.
+        '''
+        if not self.ready or self._outdated:
+            self.ensure_built()
+            # Legacy URLs can be skipped if none were seen during the last build
+            legacy = not self.ready or bool(self.outdated_note_ids())
+            return search_notes(mw.col, word_infos, deck_id, legacy=legacy)
+        self._flush_pending_added()
+        deck_ids = set(mw.col.decks.deck_and_child_ids(deck_id))
+        return self._key_map.find_many(word_infos, deck_ids)
+
+    def words(self) -> tp.List[str]:
+        '''Words of indexed notes, taken from their Word IDs ("{word}-{homonym_nr}-{lang}").'''
+        words = []
+        for entry in self._key_map.notes.values():
+            parts = entry.word_id.strip().rsplit('-', maxsplit=2)
+            if len(parts) == 3 and parts[0]:
+                words.append(parts[0])
+        return words
+
+    def outdated_note_ids(self) -> tp.List[NoteId]:
+        '''IDs of notes with legacy URLs or missing Word IDs.'''
+        return [nid for nid, entry in self._key_map.notes.items() if entry.outdated]
+
+    def add_note(self, note: Note, deck_ids: tp.Iterable[int]):
+        '''Add or update an indexed note.'''
+        self._key_map.insert(note.id, IndexedNote.from_note(note, deck_ids))
+
+    def _read_collection(self, col) -> tp.Dict[NoteId, IndexedNote]:
+        # Positions of the relevant fields in each note type that has any
+        positions = {}
+        for notetype in col.models.all():
+            names = [f['name'] for f in notetype['flds']]
+            word_id_idx = names.index(WORD_ID_FIELD) if WORD_ID_FIELD in names else None
+            url_idx = names.index(URL_FIELD) if URL_FIELD in names else None
+            if word_id_idx is not None or url_idx is not None:
+                positions[notetype['id']] = (word_id_idx, url_idx)
+        if not positions:
+            return {}
+        # Read all relevant notes with their cards' decks in a single query
+        notes = {}
+        rows = col.db.all(
+            'select n.id, n.mid, n.flds, c.did, c.odid from notes n '
+            f'join cards c on c.nid = n.id where n.mid in {ids2str(positions.keys())}'
+        )
+        for nid, mid, flds, did, odid in rows:
+            entry = notes.get(nid)
+            if entry is None:
+                values = flds.split('\x1f')
+                word_id_idx, url_idx = positions[mid]
+                word_id = values[word_id_idx] if word_id_idx is not None else ''
+                url = values[url_idx] if url_idx is not None else ''
+                entry = notes[nid] = IndexedNote.from_fields(word_id, url)
+            entry.deck_ids.add(did)
+            if odid:
+                entry.deck_ids.add(odid)
+        return notes
+
+    def _flush_pending_added(self):
+        # Notes get their IDs only after being added
+        pending = []
+        for note, deck_id in self._pending_added:
+            if note.id:
+                self.add_note(note, [deck_id])
+            else:
+                pending.append((note, deck_id))
+        self._pending_added = pending
+
+    # Callbacks
+
+    def _on_built(self, notes: tp.Dict[NoteId, IndexedNote], generation: int):
+        if generation != self._generation:
+            # The collection was closed during the build
+            return
+        self._building = False
+        if self._stale:
+            # The collection has changed during the build
+            self.build()
+            return
+        self._key_map = NoteKeyMap(notes)
+        self.ready = True
+        self._outdated = False
+        logging.debug(f'Sõnaveeb note index built: {len(notes)} notes')
+        for callback in self.ready_callbacks:
+            callback()
+
+    def _on_build_error(self, error):
+        self._building = False
+        logging.error(f'Failed to build Sõnaveeb note index: {error}')
+
+    # Anki hooks
+
+    def _on_note_will_be_added(self, col, note: Note, deck_id: int):
+        if WORD_ID_FIELD in note or URL_FIELD in note:
+            self._pending_added.append((note, deck_id))
+
+    def _on_note_will_flush(self, note: Note):
+        # Only updates are handled here, new notes don't have IDs yet
+        if note.id and note.id in self._key_map.notes:
+            self.add_note(note, self._key_map.notes[note.id].deck_ids)
+
+    def _on_notes_will_be_deleted(self, col, note_ids: tp.Sequence[NoteId]):
+        for nid in note_ids:
+            self._key_map.remove(nid)
+
+    def _on_operation_did_execute(self, changes, handler):
+        if handler is self:
+            # Operations initiated on behalf of the index keep it current via hooks
+            return
+        # Cards moved between decks, note types changed, imports, etc.
+        if changes.card or changes.notetype:
+            self.invalidate()
+        # Edits in the editor are tracked by the note hooks, but undo, redo or
+        # find and replace change notes in the backend without them
+        elif changes.note_text and not isinstance(handler, Editor):
+            self.invalidate()
@@ -1,3 +1,6 @@
+import json
+import logging
+import hashlib
 import typing as tp
 import dataclasses as dc
 from os import path
@@ -8,6 +11,13 @@ Fields = tp.List[str]
 Templates = tp.Dict[str, tp.Tuple[str, str]]
 
 
+def fingerprint(fields: Fields, sort_idx: int, templates: Templates = None, style: str = None) -> str:
+    '''Compute a hash of the expected note type content.
+    '''
+    data = json.dumps([fields, sort_idx, templates, style], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
 def add_notetype(name: str, fields: Fields, sort_idx: int, templates: Templates, style: str, metadata: dict):
     '''Create new note type.
     '''
@@ -28,71 +38,11 @@ def add_notetype(name: str, fields: Fields, sort_idx: int, templates: Templates,
     return notetype
 
 
-def update_fields(notetype, fields: Fields, sort_idx: int):
-    '''Update note type to ensure it contains expected fields.
-    '''
-    updated = False
-    models = mw.col.models
-    existing_fields = [f['name'] for f in notetype['flds']]
-    # Add missing fields
-    for field in fields:
-        if field not in existing_fields:
-            models.add_field(notetype, models.new_field(field))
-            updated = True
-    # Remove unknown fields
-    for field in notetype['flds']:
-        if field['name'] not in fields:
-            models.remove_field(notetype, field)
-            updated = True
-    # Update fields order
-    for target_idx, field_name in enumerate(fields):
-        current_idx = next(i for i, f in enumerate(notetype['flds']) if f['name'] == field_name)
-        if current_idx != target_idx:
-            models.reposition_field(notetype, notetype['flds'][current_idx], target_idx)
-            updated = True
-    # Update sort index
-    if models.sort_idx(notetype) != sort_idx:
-        models.set_sort_index(notetype, sort_idx)
-        updated = True
-    return updated
-
-
-def update_card_templates(notetype, templates: Templates, style: str):
-    '''Update note type to ensure it contains expected card templates and style.
-    '''
-    updated = False
-    models = mw.col.models
-    existing_templates = {t['name']: t for t in notetype['tmpls']}
-    for name, (front, back) in templates.items():
-        template = existing_templates.get(name)
-        if template is not None:
-            # Update existing templates
-            if template['qfmt'] != front or template['afmt'] != back:
-                template['qfmt'] = front
-                template['afmt'] = back
-                updated = True
-        else:
-            # Add missing templates
-            template = models.new_template(name)
-            template['qfmt'] = front
-            template['afmt'] = back
-            models.add_template(notetype, template)
-            updated = True
-    # Remove unknown templates
-    for name, template in existing_templates.items():
-        if name not in templates:
-            models.remove_template(notetype, template)
-            updated = True
-    # Update style
-    if notetype['css'] != style:
-        notetype['css'] = style
-        updated = True
-    return updated
-
-
 @dc.dataclass
 class NoteTypeChanges:
-    '''Descriptor of the changes to be applied to a note type.
+    '''Plan of the changes to be applied to a note type.
+
+    The same plan is used both to preview the changes and to apply them.
     '''
     fields_to_add: list = dc.field(default_factory=list)
     fields_to_remove: list = dc.field(default_factory=list)
@@ -102,26 +52,29 @@ class NoteTypeChanges:
     templates_to_remove: list = dc.field(default_factory=list)
     templates_to_update: list = dc.field(default_factory=list)
     style: bool = False
+    # Expected note type content as (fields, sort_idx, templates, style), set by compute()
+    target = None
 
     @classmethod
     def compute(cls, notetype, fields: Fields = None, sort_idx: int = 0, templates: Templates = None, style: str = None):
         '''Derive the changes to be applied to a note type in order for it to contain the expected data.
         '''
         diff = cls()
+        diff.target = (fields, sort_idx, templates, style)
         # Fields
         if fields is not None:
             existing_fields = [f['name'] for f in notetype['flds']]
             diff.fields_order = fields != existing_fields
-            diff.fields_to_add = [f for f in fields if f not in existing_fields]
-            diff.fields_to_remove = [f for f in existing_fields if f not in fields]
+            target_fields = set(fields)
+            existing_field_names = set(existing_fields)
+            diff.fields_to_add = [f for f in fields if f not in existing_field_names]
+            diff.fields_to_remove = [f for f in existing_fields if f not in target_fields]
             diff.fields_sort_index = sort_idx != notetype['sortf']
         # Card templates
         if templates is not None:
             existing_templates = {t['name']: t for t in notetype['tmpls']}
-            existing_template_names = set(existing_templates.keys())
-            target_template_names = set(templates.keys())
-            diff.templates_to_add = list(target_template_names - existing_template_names)
-            diff.templates_to_remove = list(existing_template_names - target_template_names)
+            diff.templates_to_add = [n for n in templates if n not in existing_templates]
+            diff.templates_to_remove = [n for n in existing_templates if n not in templates]
             for name, (front, back) in templates.items():
                 template = existing_templates.get(name)
                 if template is not None:
@@ -132,6 +85,48 @@ class NoteTypeChanges:
             diff.style = notetype['css'] != style
         return diff
 
+    def apply(self, notetype) -> bool:
+        '''Apply the planned changes to the note type in place, in a single pass.
+
+        The note type still needs to be saved afterwards.
+
+        Returns:
+            True if the note type was modified.
+        '''
+        if self.is_empty():
+            return False
+        models = mw.col.models
+        fields, sort_idx, templates, style = self.target
+        # Fields are rebuilt in the target order with a single assignment.
+        # Existing fields keep their ordinals, so their content is preserved.
+        if self.fields_to_add or self.fields_to_remove or self.fields_order:
+            existing_fields = {f['name']: f for f in notetype['flds']}
+            notetype['flds'] = [
+                existing_fields[name] if name in existing_fields else models.new_field(name)
+                for name in fields
+            ]
+        if self.fields_sort_index:
+            notetype['sortf'] = sort_idx
+        # Card templates
+        if self.templates_to_add or self.templates_to_remove or self.templates_to_update:
+            updated_templates = []
+            for template in notetype['tmpls']:
+                name = template['name']
+                if name in self.templates_to_remove:
+                    continue
+                if name in self.templates_to_update:
+                    template['qfmt'], template['afmt'] = templates[name]
+                updated_templates.append(template)
+            for name in self.templates_to_add:
+                template = models.new_template(name)
+                template['qfmt'], template['afmt'] = templates[name]
+                updated_templates.append(template)
+            notetype['tmpls'] = updated_templates
+        # Style
+        if self.style:
+            notetype['css'] = style
+        return True
+
     def is_required(self):
         '''Check if the note type update is required to make it valid.
         '''
@@ -161,6 +156,8 @@ class NoteTypeChanges:
 
 class NoteTypeManager:
     SONAVEEB_MARKER = 'sonaveeb_marker'
+    # Fingerprint of the content the note type was last created or updated with
+    FINGERPRINT_KEY = 'sonaveeb_fingerprint'
     # Sort field index
     SORT_FIELD = 1
     # List of fields that the note type must contain to be valid for this addon.
@@ -210,6 +207,15 @@ class NoteTypeManager:
             ),
         }
 
+        # Fingerprints of the expected content of default and custom note types
+        self._fingerprints = {
+            name: fingerprint(self.FIELDS, self.SORT_FIELD, templates, style)
+            for name, (templates, style) in self.default_notetypes.items()
+        }
+        self._custom_fingerprint = fingerprint(self.FIELDS, self.SORT_FIELD)
+        # Profile for which default note types were last checked
+        self._defaults_checked_profile = None
+
     def is_notetype_valid(self, notetype):
         '''Check if note type is suitable for this addon.
         '''
@@ -221,6 +227,24 @@ class NoteTypeManager:
         '''
         return self.SONAVEEB_MARKER in notetype
 
+    def expected_fingerprint(self, notetype) -> str:
+        '''Get the fingerprint of the content the note type is expected to have.
+        '''
+        return self._fingerprints.get(notetype['name'], self._custom_fingerprint)
+
+    def is_notetype_up_to_date(self, notetype) -> bool:
+        '''Quickly check if the note type was updated to the current content.
+
+        Fields are compared directly, since they are cheap to check and
+        required for the note type to be valid. Templates and style are
+        only compared via the fingerprint.
+        '''
+        return (
+            notetype.get(self.FINGERPRINT_KEY) == self.expected_fingerprint(notetype)
+            and notetype['sortf'] == self.SORT_FIELD
+            and [f['name'] for f in notetype['flds']] == self.FIELDS
+        )
+
     def get_valid_notetypes(self) -> tp.List[NoteType]:
         '''Get a list of note types that are intended and sutiable for this addon.
         '''
@@ -245,34 +269,71 @@ class NoteTypeManager:
         For default note types this includes fields, card templates, and style.
         For custom note types this only includes fields.
         '''
+        if self.is_notetype_up_to_date(notetype):
+            return NoteTypeChanges()
         # For default note types: check fields, templates, and style.
         # For others: check fields only.
         templates, style = self.default_notetypes.get(notetype['name'], (None, None))
         return NoteTypeChanges.compute(notetype, self.FIELDS, self.SORT_FIELD, templates, style)
 
-    def update_notetype(self, notetype) -> bool:
+    def update_notetype(self, notetype, changes: NoteTypeChanges = None) -> NoteTypeChanges:
         '''Update the note type.
 
         For default note types this includes fields, card templates, and style.
         For custom note types this only includes fields.
+
+        Args:
+            notetype: Note type to update.
+            changes: Previously computed pending update to apply, so that exactly
+                the previewed changes are applied. Computed if not specified.
+
+        Returns:
+            The applied changes.
         '''
-        # Update fields for all note types
-        updated = update_fields(notetype, self.FIELDS, self.SORT_FIELD)
-        # Update templates and style only for default note types
-        templates_and_style = self.default_notetypes.get(notetype['name'])
-        if templates_and_style is not None:
-            templates, style = templates_and_style
-            updated |= update_card_templates(notetype, templates, style)
+        if changes is None:
+            changes = self.get_pending_update(notetype)
+        updated = changes.apply(notetype)
+        if updated:
+            logging.info(f'Updating note type "{notetype["name"]}": {changes}')
+        # Remember what the note type was updated to
+        expected_fingerprint = self.expected_fingerprint(notetype)
+        if notetype.get(self.FINGERPRINT_KEY) != expected_fingerprint:
+            notetype[self.FINGERPRINT_KEY] = expected_fingerprint
+            updated = True
         # Apply updates
         if updated:
             mw.col.models.update_dict(notetype)
-        return updated
+        return changes
+
+    def get_missing_defaults(self) -> tp.List[str]:
+        '''Get names of default note types that don't exist yet.
 
-    def create_missing_defaults(self):
+        The check is done once per profile, as long as the missing
+        note types are then created via `create_missing_defaults`.
+        '''
+        if self._defaults_checked_profile == mw.pm.name:
+            return []
+        return [
+            name for name in self.default_notetypes
+            if mw.col.models.by_name(name) is None
+        ]
+
+    def create_missing_defaults(self, names: tp.Optional[tp.List[str]] = None):
         '''Create default note types if needed.
+
+        Args:
+            names: Names of default note types to create,
+                as returned by `get_missing_defaults`. Checked if not specified.
         '''
-        metadata = {self.SONAVEEB_MARKER: None}
-        for name, (templates, style) in self.default_notetypes.items():
+        if names is None:
+            names = self.get_missing_defaults()
+        for name in names:
+            templates, style = self.default_notetypes[name]
             if mw.col.models.by_name(name) is None:
+                metadata = {
+                    self.SONAVEEB_MARKER: None,
+                    self.FINGERPRINT_KEY: self._fingerprints[name],
+                }
                 add_notetype(name, self.FIELDS, self.SORT_FIELD, templates, style, metadata)
+        self._defaults_checked_profile = mw.pm.name
 
@@ -0,0 +1,41 @@
+'''
+Lookups that missed the local caches while offline.
+
+They are queued to be fetched once the network is available again, one at
+a time, so that coming back online doesn't burst requests at Sõnaveeb.
+'''
+
+import threading
+import typing as tp
+from collections import OrderedDict
+
+
+class MissQueue:
+    '''Unique pending fetches in the order they were first missed.
+
+    Each fetch is keyed by what it looks up, e.g. ('search', query), so that
+    repeated misses of the same lookup are fetched once.
+    '''
+    def __init__(self):
+        self._fetches: tp.Dict[tp.Hashable, tp.Callable[[], tp.Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._fetches)
+
+    def add(self, key: tp.Hashable, fetch: tp.Callable[[], tp.Any]):
+        '''Queue a fetch, unless the same lookup is already queued.'''
+        with self._lock:
+            self._fetches.setdefault(key, fetch)
+
+    def pop(self) -> tp.Optional[tp.Tuple[tp.Hashable, tp.Callable[[], tp.Any]]]:
+        '''The oldest queued (key, fetch) pair, or None if there are none.'''
+        with self._lock:
+            if not self._fetches:
+                return None
+            return self._fetches.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fetches.clear()
@@ -0,0 +1,88 @@
+'''
+Collection write operations, intended to run in the background via CollectionOp
+'''
+
+import typing as tp
+from collections import defaultdict
+
+from anki.collection import Collection, OpChanges, OpChangesWithCount
+from anki.notes import Note, NoteId
+from anki.utils import ids2str
+from aqt import mw
+
+
+# Notes converted per request, so that progress is reported in between
+CONVERT_CHUNK_SIZE = 500
+
+def change_notetype(
+        col: Collection,
+        note_ids: tp.Sequence[NoteId],
+        old_notetype_id: int,
+        new_notetype_id: int) -> OpChanges:
+    '''Change note type of multiple notes of the same note type at once.
+
+    Fields and card templates are mapped by name.
+    '''
+    info = col.models.change_notetype_info(
+        old_notetype_id=old_notetype_id,
+        new_notetype_id=new_notetype_id
+    )
+    request = info.input
+    request.note_ids.extend(note_ids)
+    return col.models.change_notetype_of_notes(request)
+
+
+def convert_notes(col: Collection, note_ids: tp.Sequence[NoteId], new_notetype_id: int) -> OpChangesWithCount:
+    '''Change note type of multiple notes in a single undoable step.
+
+    Notes are grouped by their current note type, and each group is
+    converted in chunks of CONVERT_CHUNK_SIZE notes.
+    '''
+    groups = defaultdict(list)
+    for nid, mid in col.db.all(f'select id, mid from notes where id in {ids2str(note_ids)}'):
+        if mid != new_notetype_id:
+            groups[mid].append(nid)
+    total = sum(len(nids) for nids in groups.values())
+    converted = 0
+    undo_entry = col.add_custom_undo_entry('Convert Sõnaveeb Notes')
+    for old_notetype_id, nids in groups.items():
+        for start in range(0, len(nids), CONVERT_CHUNK_SIZE):
+            chunk = nids[start:start + CONVERT_CHUNK_SIZE]
+            change_notetype(col, chunk, old_notetype_id, new_notetype_id)
+            converted += len(chunk)
+            mw.taskman.run_on_main(
+                lambda converted=converted: mw.progress.update(
+                    label=f'Converting Sõnaveeb notes: {converted}/{total}',
+                    value=converted,
+                    max=total,
+                )
+            )
+    changes = col.merge_undo_entries(undo_entry)
+    return OpChangesWithCount(count=converted, changes=changes)
+
+
+def update_note(col: Collection, note: Note, notetype_id: int) -> OpChanges:
+    '''Update note content and, if needed, its note type in a single undoable step.'''
+    undo_entry = col.add_custom_undo_entry('Update Sõnaveeb Note')
+    col.update_note(note)
+    if note.mid != notetype_id:
+        change_notetype(col, [note.id], note.mid, notetype_id)
+    return col.merge_undo_entries(undo_entry)
+
+
+def remove_note(col: Collection, note_id: NoteId) -> OpChangesWithCount:
+    '''Remove a note, failing if it doesn't exist.'''
+    results = col.remove_notes([note_id])
+    if results.count == 0:
+        raise RuntimeError(
+            'Your database appears to be in an inconsistent state.'
+            ' Please use the Check Database action.')
+    return results
+
+
+def add_notes(col: Collection, notes: tp.Sequence[Note], deck_id: int) -> OpChanges:
+    '''Add multiple notes to the deck in a single undoable step.'''
+    undo_entry = col.add_custom_undo_entry('Add Sõnaveeb Notes')
+    for note in notes:
+        col.add_note(note, deck_id)
+    return col.merge_undo_entries(undo_entry)
@@ -0,0 +1,104 @@
+import os
+import json
+import logging
+import typing as tp
+from collections import defaultdict
+
+from .sonaveeb import WordInfo
+
+
+def _normalize(word: str) -> str:
+    return word.strip().lower()
+
+
+class PivotIndex:
+    '''Offline pivot translation based on previously seen Sõnaveeb lexemes.
+
+    Every lexeme lists translations of the same sense into several languages,
+    so they can be treated as translations of each other. The index maps each
+    (language, word) pair to the words it co-occurred with in other languages.
+    '''
+    def __init__(self, path: tp.Optional[str] = None):
+        self._path = path
+        # Raw translations per lexeme: "{word_id}:{lexeme_id}" -> {lang: [words]}
+        self._lexemes = {}
+        # (lang, word) -> target lang -> target word -> set of lexeme keys
+        self._index = defaultdict(lambda: defaultdict(lambda: defaultdict(set)))
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._lexemes)
+
+    def add(self, word_info: WordInfo):
+        '''Index translations of all lexemes of the word.'''
+        for lexeme in word_info.lexemes or []:
+            key = f'{word_info.word_id}:{lexeme.lexeme_id}'
+            if len(lexeme.translations) < 2 or key in self._lexemes:
+                # Nothing to pivot through, or already indexed
+                continue
+            self._lexemes[key] = lexeme.translations
+            self._index_lexeme(key, lexeme.translations)
+            self._dirty = True
+
+    def translate(self, sources: tp.Dict[str, tp.List[str]], lang: str) -> tp.List[str]:
+        '''Propose translations into the target language via known lexemes.
+
+        A candidate is considered confident if it is reachable from at least
+        two source languages (or from the only one, if there's just one).
+
+        Args:
+            sources: pairs of source language code and a list of words in that language.
+            lang: target translation language.
+
+        Returns:
+            Confident candidates ordered by support, or an empty list.
+        '''
+        # Target word -> source languages and lexemes that support it
+        support_langs = defaultdict(set)
+        support_lexemes = defaultdict(set)
+        for source_lang, words in sources.items():
+            if source_lang == lang:
+                continue
+            for word in words:
+                targets = self._index.get((source_lang, _normalize(word)), {}).get(lang, {})
+                for target, lexeme_keys in targets.items():
+                    support_langs[target].add(source_lang)
+                    support_lexemes[target] |= lexeme_keys
+        threshold = min(len(sources), 2)
+        confident = [t for t, langs in support_langs.items() if len(langs) >= threshold]
+        confident.sort(key=lambda t: (len(support_langs[t]), len(support_lexemes[t])), reverse=True)
+        return confident
+
+    def load(self):
+        '''Load indexed lexemes from disk.'''
+        try:
+            with open(self._path, 'r', encoding='utf-8') as file:
+                lexemes = json.load(file)
+        except (OSError, ValueError) as e:
+            logging.error(f'Failed to load pivot translation index: {e}')
+            return
+        for key, translations in lexemes.items():
+            self._lexemes[key] = translations
+            self._index_lexeme(key, translations)
+        self._dirty = False
+
+    def save(self):
+        '''Save indexed lexemes to disk if anything changed.'''
+        if self._path is None or not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        with open(self._path, 'w', encoding='utf-8') as file:
+            json.dump(self._lexemes, file, ensure_ascii=False)
+        self._dirty = False
+
+    def _index_lexeme(self, key: str, translations: tp.Dict[str, tp.List[str]]):
+        for source_lang, source_words in translations.items():
+            for source_word in source_words:
+                entry = self._index[(source_lang, _normalize(source_word))]
+                for target_lang, target_words in translations.items():
+                    if target_lang == source_lang:
+                        continue
+                    for target_word in target_words:
+                        entry[target_lang][target_word].add(key)
@@ -9,7 +9,9 @@
 
 import os
 import re
+import sys
 import enum
+import marshal
 import logging
 import typing as tp
 import urllib.parse
@@ -18,6 +20,16 @@ import dataclasses as dc
 import requests
 import bs4
 
+try:
+    from .tracing import tracer
+    from .netstats import netstats
+    from .cache import LookupCache, PageKind, content_hash
+except ImportError:
+    # Imported as a standalone module, e.g. from scripts
+    from tracing import tracer
+    from netstats import netstats
+    from cache import LookupCache, PageKind, content_hash
+
 
 # Essential to study forms per word class (part of speech).
 # For word classes not listed here only the first form is used.
@@ -31,6 +43,13 @@ ESSENTIAL_FORMS_BY_CLASS = dict(
     tegusõna=['ma-tegevusnimi', 'da-tegevusnimi', 'kindla kõneviisi oleviku ainsuse 3.p.'],
 )
 
+# Matches word URLs in both current and historical formats stored by older
+# addon versions: with repeated slashes after the domain, an optional dataset
+# segment (eki/dsall), and a missing language suffix.
+LEGACY_URL_REGEX = re.compile(r'sonaveeb\.ee/+search/(\w+)/dlall/(?:\w+/)?([^/]+)/(\d+)(?:/(\w+))?$')
+# URL path segment of each Sõnaveeb mode
+MODE_URL_SEGMENTS = dict(lite='Lite', unif='Advanced')
+
 
 def compress_word_forms(forms: tp.List[str]) -> tp.List[str]:
     '''Shortens word forms by deduplicating a common part.
@@ -52,11 +71,96 @@ def compress_word_forms(forms: tp.List[str]) -> tp.List[str]:
         return forms
 
 
+def legacy_url_key(url: str) -> tp.Optional[tp.Tuple[str, str, str]]:
+    '''Normalize Sõnaveeb word URL, including variants stored by older addon versions.
+
+    Returns:
+        (word, homonym_nr, lang) tuple, where lang is None if missing from the URL,
+        or None if the URL is not a Sõnaveeb word URL.
+    '''
+    if match := LEGACY_URL_REGEX.search(url.strip()):
+        _mode, word, homonym_nr, lang = match.groups()
+        return word.lower(), homonym_nr, lang
+    return None
+
+
+def canonical_word_url(url: str, default_lang: str = 'et') -> tp.Optional[tp.Tuple[str, str]]:
+    '''Convert Sõnaveeb word URL, including legacy variants, to the current format.
+
+    Args:
+        url: Word URL as stored in a note.
+        default_lang: Language to assume if missing from the URL.
+
+    Returns:
+        (url, word_id) tuple, or None if the URL is not a Sõnaveeb word URL.
+    '''
+    match = LEGACY_URL_REGEX.search(url.strip())
+    if match is None:
+        return None
+    mode_segment, word, homonym_nr, lang = match.groups()
+    if mode_segment not in MODE_URL_SEGMENTS:
+        return None
+    mode = SonaveebMode[MODE_URL_SEGMENTS[mode_segment]]
+    lang = lang or default_lang
+    canonical_url = Sonaveeb.MODE_URLS[mode].search.format(word=word) + f'/{homonym_nr}/{lang}'
+    word_id = f'{urllib.parse.unquote(word)}-{homonym_nr}-{lang}'
+    return canonical_url, word_id
+
+
+# Version of the binary serialization format of WordInfo
+SERIALIZATION_VERSION = 1
+BASE_URL = 'https://sonaveeb.ee'
+
+
+def slotted(cls):
+    '''Recreate a dataclass with `__slots__`, like `dc.dataclass(slots=True)` in Python 3.10+.
+
+    Slotted instances have no per-instance `__dict__`, which makes them
+    noticeably smaller when many of them are held in caches and indices.
+    '''
+    names = tuple(f.name for f in dc.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    for name in names + ('__dict__', '__weakref__'):
+        cls_dict.pop(name, None)
+    cls_dict['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def _intern(value: tp.Optional[str]) -> tp.Optional[str]:
+    # Values repeated across many entries, such as form names and language codes
+    return sys.intern(str(value)) if value is not None else None
+
+
+def _plain(value):
+    # Convert str subclasses (e.g. bs4.NavigableString) in nested containers,
+    # since marshal only supports builtin types
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {_plain(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+def _strip_base_url(url: tp.Optional[str]) -> tp.Optional[str]:
+    if url is not None and url.startswith(BASE_URL):
+        return url[len(BASE_URL):]
+    return url
+
+
+def _restore_base_url(path: tp.Optional[str]) -> tp.Optional[str]:
+    if path is not None and path.startswith('/'):
+        return BASE_URL + path
+    return path
+
+
 class SonaveebMode(enum.Enum):
     Lite = 0
     Advanced = 1
 
 
+@slotted
 @dc.dataclass
 class LexemeInfo:
     lexeme_id: int
@@ -69,6 +173,7 @@ class LexemeInfo:
     level: str = None
 
 
+@slotted
 @dc.dataclass
 class WordInfo:
     word_id: str = None
@@ -88,6 +193,71 @@ class WordInfo:
                 f'"{self.word}" [##{self.word_id}]: {missing_forms}'
             )
 
+    def to_bytes(self) -> bytes:
+        '''Serialize into a compact binary representation.
+
+        The format is intended for local caches, it is not guaranteed
+        to be compatible between addon versions.
+        '''
+        lexemes = None
+        if self.lexemes is not None:
+            lexemes = [
+                (
+                    lexeme.lexeme_id, lexeme.definitions, lexeme.rection, lexeme.synonyms,
+                    lexeme.translations, lexeme.examples, lexeme.marker, lexeme.level,
+                )
+                for lexeme in self.lexemes
+            ]
+        morphology_audio_urls = {
+            key: _strip_base_url(url) for key, url in self.morphology_audio_urls.items()
+        }
+        return marshal.dumps(_plain((
+            SERIALIZATION_VERSION, self.word_id, self.word, self.word_class,
+            _strip_base_url(self.word_audio_url), self.url, lexemes,
+            self.morphology, morphology_audio_urls,
+        )))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'WordInfo':
+        '''Deserialize from a representation produced by `to_bytes`.
+
+        Raises:
+            ValueError: if the data is invalid or of an unsupported version.
+        '''
+        try:
+            fields = marshal.loads(data)
+        except (EOFError, TypeError) as e:
+            raise ValueError(f'Invalid serialized WordInfo: {e}') from e
+        if not isinstance(fields, tuple) or len(fields) != 9:
+            raise ValueError(f'Invalid serialized WordInfo: {type(fields).__name__}')
+        if fields[0] != SERIALIZATION_VERSION:
+            raise ValueError(f'Unsupported WordInfo serialization version: {fields[0]}')
+        (_, word_id, word, word_class, word_audio_url, url,
+         lexemes, morphology, morphology_audio_urls) = fields
+        if lexemes is not None:
+            lexemes = [
+                LexemeInfo(
+                    lexeme_id, definitions, rection, synonyms,
+                    {_intern(lang): words for lang, words in translations.items()},
+                    examples, marker, _intern(level),
+                )
+                for (lexeme_id, definitions, rection, synonyms,
+                     translations, examples, marker, level) in lexemes
+            ]
+        return cls(
+            word_id=word_id,
+            word=word,
+            word_class=_intern(word_class),
+            word_audio_url=_restore_base_url(word_audio_url),
+            url=url,
+            lexemes=lexemes,
+            morphology={_intern(key): form for key, form in morphology.items()},
+            morphology_audio_urls={
+                _intern(key): _restore_base_url(path)
+                for key, path in morphology_audio_urls.items()
+            },
+        )
+
     def audio_urls(self) -> tp.List[str]:
         '''Returns a list audio URLs corresponding to essential_forms list.
 
@@ -125,8 +295,7 @@ class WordInfo:
     def legacy_url_regex(self) -> str:
         '''Regex matching URL variants stored in notes by older addon versions.
 
-        Tolerates historical variations: repeated slashes after the domain,
-        an optional dataset segment (eki/dsall), and a missing language suffix.
+        Tolerates the same historical variations as `LEGACY_URL_REGEX`.
         '''
         word, homonym_nr, lang = self.url.rsplit('/', 3)[1:]
         return (
@@ -134,6 +303,10 @@ class WordInfo:
             f'{re.escape(word)}/{homonym_nr}(?:/{lang})?$'
         )
 
+    def legacy_url_key(self) -> tp.Optional[tp.Tuple[str, str, str]]:
+        '''Key of this word's URL, comparable with `legacy_url_key` of note URLs.'''
+        return legacy_url_key(self.url)
+
     def present_form_types(self) -> tp.List[str]:
         '''Returns essential form names that are present for this word.
 
@@ -152,7 +325,8 @@ class WordInfo:
         return [k for k in keys if k not in self.morphology]
 
 
-@dc.dataclass
+@slotted
+@dc.dataclass(frozen=True)
 class WordReference:
     word_id: str
     url: str
@@ -162,6 +336,52 @@ class WordReference:
     summary: str = None
 
 
+def references_to_bytes(references: tp.List[WordReference]) -> bytes:
+    '''Serialize word references, see `WordInfo.to_bytes`.'''
+    return marshal.dumps(_plain((
+        SERIALIZATION_VERSION,
+        [(r.word_id, r.url, r.lang, r.name, r.matches, r.summary) for r in references],
+    )))
+
+
+def references_from_bytes(data: bytes) -> tp.List[WordReference]:
+    '''Deserialize word references produced by `references_to_bytes`.
+
+    Raises:
+        ValueError: if the data is invalid or of an unsupported version.
+    '''
+    try:
+        version, references = marshal.loads(data)
+    except (EOFError, TypeError) as e:
+        raise ValueError(f'Invalid serialized WordReference list: {e}') from e
+    if version != SERIALIZATION_VERSION:
+        raise ValueError(f'Unsupported WordReference serialization version: {version}')
+    return [
+        WordReference(word_id, url, _intern(lang), name, matches, summary)
+        for word_id, url, lang, name, matches, summary in references
+    ]
+
+
+def base_forms_to_bytes(pref_words: tp.List[str], form_words: tp.List[str]) -> bytes:
+    '''Serialize base form search results, see `WordInfo.to_bytes`.'''
+    return marshal.dumps(_plain((SERIALIZATION_VERSION, pref_words, form_words)))
+
+
+def base_forms_from_bytes(data: bytes) -> tp.Tuple[tp.List[str], tp.List[str]]:
+    '''Deserialize base form search results produced by `base_forms_to_bytes`.
+
+    Raises:
+        ValueError: if the data is invalid or of an unsupported version.
+    '''
+    try:
+        version, pref_words, form_words = marshal.loads(data)
+    except (EOFError, TypeError) as e:
+        raise ValueError(f'Invalid serialized base forms: {e}') from e
+    if version != SERIALIZATION_VERSION:
+        raise ValueError(f'Unsupported base forms serialization version: {version}')
+    return pref_words, form_words
+
+
 @dc.dataclass
 class LookupUrls:
     forms: str
@@ -174,7 +394,7 @@ class Sonaveeb:
     There are two ways of using it:
     - High-level API: simply
     '''
-    BASE_URL = 'https://sonaveeb.ee'
+    BASE_URL = BASE_URL
     MODE_URLS = {
         SonaveebMode.Lite: LookupUrls(
             forms='https://sonaveeb.ee/searchwordfrag/lite/{word}',
@@ -187,8 +407,9 @@ class Sonaveeb:
     }
     DEFAULT_MODE = SonaveebMode.Lite
 
-    def __init__(self):
+    def __init__(self, cache: tp.Optional[LookupCache] = None):
         self.session = requests.Session()
+        self.cache = cache
         self.set_mode(self.DEFAULT_MODE)
 
     def set_mode(self, mode: SonaveebMode) -> None:
@@ -208,13 +429,20 @@ class Sonaveeb:
             base_forms: list of words in their base forms, a form
                 of which the query word could be.
         '''
-        self._ensure_session(timeout=timeout)
         url = self.urls.forms.format(word=word)
-        resp = self._request(url, timeout=timeout)
-        data = resp.json()
-        base_forms = data['formWords']
-        exact_match = word if word in data['prefWords'] else None
-        return exact_match, base_forms
+        if (cached := self._cached_entry(url, base_forms_from_bytes)) is not None:
+            pref_words, form_words = cached
+        else:
+            self._ensure_session(timeout=timeout)
+            with tracer.span('sonaveeb.searchwordfrag'):
+                resp = self._request(url, timeout=timeout)
+            data = resp.json()
+            pref_words, form_words = data['prefWords'], data['formWords']
+            if self.cache is not None:
+                self.cache.put_page(url, PageKind.FORMS, resp.content, resp.headers)
+                self.cache.put_entry(url, base_forms_to_bytes(pref_words, form_words))
+        exact_match = word if word in pref_words else None
+        return exact_match, form_words
 
     def get_references(self, base_form: str, lang='et', timeout=None, debug=False) -> tp.List[WordReference]:
         '''Get a list of references for all homonyms of the word.
@@ -225,13 +453,24 @@ class Sonaveeb:
         Returns:
             references: List of WordReference objects.
         '''
-        # Request word lookup page
-        dom = self._word_lookup_dom(base_form, timeout=None)
-        # Save HTML page for debugging
-        if debug:
-            open(os.path.join('debug', f'lookup_{base_form}.html'), 'w').write(dom.prettify())
-        # Parse results
-        references = self._parse_search_results(dom, lang=lang)
+        url = self.urls.search.format(word=base_form)
+        if (cached := self._cached_entry(url, references_from_bytes)) is not None:
+            references = cached
+        else:
+            # Request word lookup page
+            debug_name = f'lookup_{base_form}' if debug else None
+            dom = self._word_lookup_dom(base_form, timeout=None, debug_name=debug_name)
+            # Parse results, and release the tree right away rather than on GC
+            try:
+                with tracer.span('sonaveeb.extract'):
+                    references = self._parse_search_results(dom)
+            finally:
+                dom.decompose()
+            if self.cache is not None:
+                self.cache.put_entry(url, references_to_bytes(references))
+        # Filter by language
+        if lang is not None:
+            references = [r for r in references if r.lang == lang]
         return references
 
     def get_word_info_by_reference(self, reference: WordReference, timeout=None, debug=False):
@@ -243,17 +482,60 @@ class Sonaveeb:
         Returns:
             word_info: WordInfo object.
         '''
+        if (cached := self._cached_entry(reference.url, WordInfo.from_bytes)) is not None:
+            return cached
+
         # Request word details page
-        dom = self._word_details_dom(reference.url, timeout=timeout)
+        debug_name = f'details_{reference.name}' if debug else None
+        dom = self._word_details_dom(reference.url, timeout=timeout, debug_name=debug_name)
+        word_info = self._extract_word_info(dom, reference)
+        if self.cache is not None:
+            self.cache.put_entry(reference.url, word_info.to_bytes())
+        return word_info
 
-        # Save HTML page for debugging
-        if debug:
-            open(os.path.join('debug', f'details_{reference.name}.html'), 'w').write(dom.prettify())
+    def get_cached_word_info(self, reference: WordReference) -> tp.Optional[tp.Tuple[WordInfo, bool]]:
+        '''Get word info from the cache regardless of its age.
 
-        # Parse results
-        word_info = self._parse_word_info(dom)
-        word_info.word_id = reference.word_id
-        word_info.url = reference.url
+        Returns:
+            (word_info, stale) tuple, or None if the word isn't cached.
+        '''
+        if self.cache is None or (data := self.cache.get_entry(reference.url)) is None:
+            return None
+        try:
+            word_info = WordInfo.from_bytes(data)
+        except ValueError as e:
+            logging.warning(f'Dropping cached word info: {e}')
+            self.cache.remove_entry(reference.url)
+            return None
+        netstats.record_cache_hit(reference.url)
+        return word_info, not self.cache.is_fresh(reference.url)
+
+    def revalidate_word_info(self, reference: WordReference, timeout=None) -> tp.Optional[WordInfo]:
+        '''Check whether cached word info is still up to date, and refresh it if not.
+
+        Uses a conditional request if the cached page has validators (ETag,
+        Last-Modified), otherwise compares the content hash of the page.
+
+        Returns:
+            Updated word info, or None if the parsed entry hasn't changed.
+        '''
+        url = reference.url
+        page = self.cache.get_page(url) if self.cache is not None else None
+        headers = page.validators() if page is not None else {}
+        self._ensure_session(timeout=timeout)
+        with tracer.span('sonaveeb.revalidate'):
+            resp = self._request(url, allowed_statuses=(200, 304), timeout=timeout, headers=headers)
+        if self.cache is None:
+            return self._extract_word_info(self._parse_html(resp), reference)
+        if resp.status_code == 304 or (page is not None and page.content_hash == content_hash(resp.content)):
+            self.cache.touch_page(url)
+            return None
+        self.cache.put_page(url, PageKind.DETAILS, resp.content, resp.headers)
+        word_info = self._extract_word_info(self._parse_html(resp), reference)
+        data = word_info.to_bytes()
+        if data == self.cache.get_entry(url):
+            return None
+        self.cache.put_entry(url, data)
         return word_info
 
     def get_word_info(self, word: str, lang='et', timeout=None, debug=False):
@@ -279,26 +561,91 @@ class Sonaveeb:
             return None
         return self.get_word_info_by_reference(homonyms[0], timeout, debug)
 
-    def _request(self, *args, **kwargs):
-        resp = self.session.get(*args, **kwargs)
-        if resp.status_code != 200:
+    def is_reachable(self, timeout=None) -> bool:
+        '''Check whether Sõnaveeb responds, even in offline mode.'''
+        try:
+            resp = self.session.head(self.BASE_URL, timeout=timeout)
+        except requests.RequestException:
+            return False
+        return resp.status_code < 500
+
+    def _request(self, url, allowed_statuses=(200,), **kwargs):
+        netstats.check(url)
+        try:
+            resp = self.session.get(url, **kwargs)
+        except requests.RequestException:
+            netstats.record_request(url, failed=True)
+            raise
+        error = resp.status_code not in allowed_statuses
+        netstats.record_request(url, len(resp.content), error=error)
+        if error:
             raise RuntimeError(f'Request failed: {resp.status_code}')
         return resp
 
+    def _extract_word_info(self, dom, reference):
+        # Parse results, and release the tree right away rather than on GC
+        try:
+            with tracer.span('sonaveeb.extract'):
+                word_info = self._parse_word_info(dom)
+        finally:
+            dom.decompose()
+        word_info.word_id = reference.word_id
+        word_info.url = reference.url
+        return word_info
+
+    def _cached_entry(self, url, deserialize):
+        # Deserialized entry from the cache if it's fresh, or if only cached
+        # data may be used anyway (offline, or the network quota is exceeded).
+        # Entries that can't be deserialized, e.g. written by another version,
+        # are dropped and treated as cache misses.
+        if self.cache is None:
+            return None
+        if not netstats.network_allowed():
+            data = self.cache.get_entry(url)
+        else:
+            data = self.cache.get_fresh_entry(url)
+        if data is None:
+            return None
+        try:
+            entry = deserialize(data)
+        except ValueError as e:
+            logging.warning(f'Dropping cached entry of {url}: {e}')
+            self.cache.remove_entry(url)
+            return None
+        netstats.record_cache_hit(url)
+        return entry
+
     def _ensure_session(self, timeout=None):
         if 'ww-sess' not in self.session.cookies:
-            self._request(self.BASE_URL)
+            with tracer.span('sonaveeb.session'):
+                self._request(self.BASE_URL)
 
-    def _word_lookup_dom(self, word, timeout=None):
+    def _word_lookup_dom(self, word, timeout=None, debug_name=None):
         self._ensure_session(timeout=timeout)
         url = self.urls.search.format(word=word)
-        resp = self._request(url, timeout=timeout)
-        return bs4.BeautifulSoup(resp.text, 'html.parser')
+        with tracer.span('sonaveeb.search_page'):
+            resp = self._request(url, timeout=timeout)
+        if self.cache is not None:
+            self.cache.put_page(url, PageKind.SEARCH, resp.content, resp.headers)
+        return self._parse_html(resp, debug_name)
 
-    def _word_details_dom(self, url, timeout=None):
+    def _word_details_dom(self, url, timeout=None, debug_name=None):
         self._ensure_session(timeout=timeout)
-        resp = self._request(url, timeout=timeout)
-        return bs4.BeautifulSoup(resp.text, 'html.parser')
+        with tracer.span('sonaveeb.details_page'):
+            resp = self._request(url, timeout=timeout)
+        if self.cache is not None:
+            self.cache.put_page(url, PageKind.DETAILS, resp.content, resp.headers)
+        return self._parse_html(resp, debug_name)
+
+    @staticmethod
+    def _parse_html(resp, debug_name=None):
+        # Save HTML page for debugging as received, without building
+        # a prettified copy of the whole tree
+        if debug_name is not None:
+            with open(os.path.join('debug', f'{debug_name}.html'), 'wb') as file:
+                file.write(resp.content)
+        with tracer.span('sonaveeb.html_parse'):
+            return bs4.BeautifulSoup(resp.text, 'html.parser')
 
     def _parse_search_results(self, dom, lang=None):
         # Parse homonyms list
@@ -316,14 +663,14 @@ class Sonaveeb:
                 url=self.BASE_URL + href,
             )
             if language := homonym_block.find(class_='lang-code'):
-                kwargs['lang'] = language.string
+                kwargs['lang'] = _intern(language.string)
             if body := homonym_block.find(class_='homonym__body'):
                 if name := body.find(class_='text-body-two'):
-                    kwargs['name'] = name.span.span.string
+                    kwargs['name'] = self._string(name.span.span)
                 if text := body.find(class_='homonym__text'):
                     if matches := text.find(class_='homonym__matches'):
-                        kwargs['matches'] = matches.string
-                    kwargs['summary'] = text.p.string
+                        kwargs['matches'] = self._string(matches)
+                    kwargs['summary'] = self._string(text.p)
             homonyms.append(WordReference(**kwargs))
 
         # Filter by language
@@ -341,7 +688,7 @@ class Sonaveeb:
         # Get basic word info
         title_block = dom.find(class_='word-results').div.div
         if homonym_name := title_block.find(class_='search__lex-title'):
-            info.word = homonym_name.span.string
+            info.word = self._string(homonym_name.span)
 
         # Get main audio URL
         if audio_button := title_block.find('button', class_='btn-speaker'):
@@ -350,7 +697,7 @@ class Sonaveeb:
 
         # Parse word class (part of speech)
         if word_class_tag := title_block.find(class_='lang-code--unrestricted'):
-            info.word_class = word_class_tag.string
+            info.word_class = _intern(word_class_tag.string)
 
         # Parse lexemes
         info.lexemes = []
@@ -364,7 +711,7 @@ class Sonaveeb:
             if morphology_table := morphology_paradigm.find('table'):
                 cells = morphology_table.find_all('span', class_='form-value-field')
                 for cell in cells:
-                    key = cell.get('title').split(' - ')[0]
+                    key = _intern(cell.get('title').split(' - ')[0])
                     value = self._remove_eki_tags(cell)
                     # Some forms have multiple entries, use the first one.
                     # For example, mitmuse osastav has short and long form.
@@ -383,7 +730,7 @@ class Sonaveeb:
 
         # Get lexeme list marker
         if marker_block := dom.find(class_='lexeme-level'):
-            lexeme.marker = marker_block.string
+            lexeme.marker = self._string(marker_block)
 
         # Skip nested lexemes
         if ignore_nested and lexeme.marker and '.' in lexeme.marker:
@@ -393,7 +740,7 @@ class Sonaveeb:
         if definition_row := dom.find(class_='definition-row'):
             # Extract language level if present
             if level_span := definition_row.find(title='Keeleoskustase'):
-                lexeme.level = level_span.string.strip()
+                lexeme.level = _intern(level_span.string.strip())
             # Extract definitions
             for entry in definition_row.find_all(class_='definition-value'):
                 if text := self._remove_eki_tags(entry):
@@ -403,7 +750,7 @@ class Sonaveeb:
         translation_blocks = dom.find_all(id=re.compile('^matches-show-more-panel'))
         for block in translation_blocks:
             if lang_code_span := block.find(class_='lang-code'):
-                lang = lang_code_span.string
+                lang = _intern(lang_code_span.string)
                 translations = [
                     self._remove_eki_tags(translation_item.a.span)
                     for translation_item in block.find_all('li')
@@ -413,22 +760,30 @@ class Sonaveeb:
 
         # Parse examples
         for example_span in dom.find_all(class_='example-text'):
-            if example_span.span.string:
-                lexeme.examples.append(example_span.span.string)
+            if example := self._string(example_span.span):
+                lexeme.examples.append(example)
 
         # Parse rections
         if rection_div := dom.find(class_='rekts-est'):
             for rection_span in rection_div.find_all('span', class_='lang-code--unrestricted'):
-                if rection_span.string:
-                    lexeme.rection.append(rection_span.string)
+                if rection := self._string(rection_span):
+                    lexeme.rection.append(rection)
 
         # Parse synonyms
         for synonym_link in dom.find_all('a', class_='synonym'):
             if synonym_link.span:
-                lexeme.synonyms.append(synonym_link.span.string)
+                lexeme.synonyms.append(self._string(synonym_link.span))
 
         return lexeme
 
+    @staticmethod
+    def _string(element) -> tp.Optional[str]:
+        # Plain copy of the element's string. NavigableString keeps references
+        # into the parse tree, which would keep the whole tree alive.
+        if element is None or element.string is None:
+            return None
+        return str(element.string)
+
     @staticmethod
     def _remove_eki_tags(element):
         if not element:
@@ -0,0 +1,109 @@
+'''
+Lightweight latency tracing of lookup stages.
+
+Spans measure the wall time of individual stages, such as network requests
+or HTML parsing. Each span is attributed to the trace that was active when
+it started, which normally covers a single search in the dialog, and is
+aggregated per stage name. Recording a span only costs two `perf_counter`
+calls and a dictionary update, so tracing is always enabled.
+'''
+
+import os
+import json
+import time
+import logging
+import threading
+import contextlib
+import typing as tp
+
+
+class Trace:
+    '''Stage timings aggregated over a single search.'''
+    def __init__(self, label: str):
+        self.label = label
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        # Stage name -> [count, total seconds, max seconds]
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add(self, name: str, duration: float):
+        '''Account a stage duration in seconds.'''
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                self._stages[name] = [1, duration, duration]
+            else:
+                stage[0] += 1
+                stage[1] += duration
+                stage[2] = max(stage[2], duration)
+
+    def to_dict(self) -> dict:
+        '''Serializable representation, with durations in milliseconds.'''
+        with self._lock:
+            stages = {
+                name: dict(count=count, total_ms=round(total * 1000, 2), max_ms=round(longest * 1000, 2))
+                for name, (count, total, longest) in self._stages.items()
+            }
+        return dict(
+            label=self.label,
+            started_at=self.started_at,
+            elapsed_ms=round(self.elapsed * 1000, 2),
+            stages=stages,
+        )
+
+    def summary(self) -> str:
+        '''Human-readable summary, with the slowest stages first.'''
+        data = self.to_dict()
+        lines = [f'{data["label"]}: {data["elapsed_ms"]:.0f} ms']
+        stages = sorted(data['stages'].items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        for name, stage in stages:
+            lines.append(
+                f'{name}: {stage["total_ms"]:.1f} ms'
+                f' ({stage["count"]}x, max {stage["max_ms"]:.1f} ms)'
+            )
+        return '\n'.join(lines)
+
+
+class Tracer:
+    '''Keeps track of the active trace and records spans into it.'''
+    def __init__(self):
+        self.current: tp.Optional[Trace] = None
+        # JSON lines file to append finished traces to, if set
+        self.log_path: tp.Optional[str] = None
+
+    def begin(self, label: str) -> Trace:
+        '''Finish the active trace, and start a new one.'''
+        self.finish()
+        self.current = Trace(label)
+        return self.current
+
+    def finish(self):
+        '''Finish the active trace, and log it if enabled.'''
+        trace, self.current = self.current, None
+        if trace is None or self.log_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(trace.to_dict(), ensure_ascii=False) + '\n')
+        except OSError as e:
+            logging.error(f'Failed to write trace log: {e}')
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        '''Measure the duration of the enclosed block as a stage of the active trace.'''
+        trace = self.current
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if trace is not None:
+                trace.add(name, time.perf_counter() - start)
+
+
+tracer = Tracer()
@@ -12,7 +12,9 @@ from aqt.theme import theme_manager
 from aqt.operations import QueryOp
 
 from ..sonaveeb import LexemeInfo
+from ..pivot import PivotIndex
 from ..gtranslate import cross_translate
+from ..netstats import NetworkRefused
 from ..globals import REQUEST_TIMEOUT
 from .common import HSeparator
 
@@ -29,9 +31,11 @@ class LexemeWidget(QWidget):
             word_class: str,
             examples_limit: int = None,
             translations_limit: int = None,
+            pivot_index: Optional[PivotIndex] = None,
             parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.lexeme = lexeme
+        self.pivot_index = pivot_index
         self.word_class = word_class
         self.examples_limit = examples_limit
         self.translations_limit = translations_limit
@@ -57,35 +61,36 @@ class LexemeWidget(QWidget):
         translation_layout.addWidget(self.translation_status)
         self.layout.addLayout(translation_layout)
 
-        # Add definition if present
-        if lexeme.definitions:
-            # Usually when multiple definitions is available, they end with semicolon,
-            # so it's ok to join them over a space character
-            definition_label = QLabel(f'**Definition:** *{" ".join(lexeme.definitions)}*')
-            definition_label.setTextFormat(Qt.TextFormat.MarkdownText)
-            definition_label.setWordWrap(True)
-            self.layout.addWidget(definition_label)
-
-        # Add examples
-        if lexeme.examples:
-            examples = '- ' + '\n- '.join(lexeme.examples[:examples_limit])
-            examples_label = QLabel(f'**Examples:**\n{examples}')
-            examples_label.setTextFormat(Qt.TextFormat.MarkdownText)
-            examples_label.setWordWrap(True)
-            self.layout.addWidget(examples_label)
-
-        # Add rection
-        if lexeme.rection:
-            rection = ', '.join(lexeme.rection)
-            rection_label = QLabel(f'**Rection:** {rection}')
-            rection_label.setTextFormat(Qt.TextFormat.MarkdownText)
-            self.layout.addWidget(rection_label)
-
-        # Add language level
-        if lexeme.level:
-            level_label = QLabel(f'**Level:** {lexeme.level}')
-            level_label.setTextFormat(Qt.TextFormat.MarkdownText)
-            self.layout.addWidget(level_label)
+        # Add definition, examples, rection and language level labels,
+        # hidden unless present
+        self.definition_label = QLabel()
+        self.definition_label.setWordWrap(True)
+        self.examples_label = QLabel()
+        self.examples_label.setWordWrap(True)
+        self.rection_label = QLabel()
+        self.level_label = QLabel()
+        for label in [self.definition_label, self.examples_label, self.rection_label, self.level_label]:
+            label.setTextFormat(Qt.TextFormat.MarkdownText)
+            self.layout.addWidget(label)
+        self.set_lexeme(lexeme)
+
+    def set_lexeme(self, lexeme: LexemeInfo):
+        '''Update displayed lexeme information in place.'''
+        translations_changed = lexeme.translations != self.lexeme.translations
+        self.lexeme = lexeme
+        # Usually when multiple definitions is available, they end with semicolon,
+        # so it's ok to join them over a space character
+        self.definition_label.setText(f'**Definition:** *{" ".join(lexeme.definitions)}*')
+        self.definition_label.setVisible(bool(lexeme.definitions))
+        examples = '- ' + '\n- '.join(lexeme.examples[:self.examples_limit])
+        self.examples_label.setText(f'**Examples:**\n{examples}')
+        self.examples_label.setVisible(bool(lexeme.examples))
+        self.rection_label.setText(f'**Rection:** {", ".join(lexeme.rection)}')
+        self.rection_label.setVisible(bool(lexeme.rection))
+        self.level_label.setText(f'**Level:** {lexeme.level}')
+        self.level_label.setVisible(bool(lexeme.level))
+        if translations_changed and self.lang is not None:
+            self.set_translation_language(self.lang)
 
     def set_translation_language(self, lang):
         self.lang = lang
@@ -98,12 +103,22 @@ class LexemeWidget(QWidget):
             # No translations available for this lexeme
             self.set_translations(None)
             self.set_translation_status('No translations available')
+        elif pivot := self.pivot_translations(lang):
+            # Translate offline via other known lexemes
+            self.set_translations(pivot)
+            self.set_translation_status('Translated via Sõnaveeb')
         else:
             # Request translations from external source
             self.set_translation_status('Google translating...')
             self.request_cross_translations()
         return bool(translations)
 
+    def pivot_translations(self, lang) -> List[str]:
+        '''Translations derived from previously seen lexemes, if confident.'''
+        if self.pivot_index is None:
+            return []
+        return self.pivot_index.translate(self.lexeme.translations, lang)
+
     def set_translations(self, translations: List[str]):
         '''Update the translations display'''
         translations = translations or []
@@ -136,7 +151,10 @@ class LexemeWidget(QWidget):
         '''Handle translation request errors'''
         self.translation_in_progress = False
         self.translations_requested.emit(False)
-        self.set_translation_status('Failed to translate :(')
+        if isinstance(error, NetworkRefused):
+            self.set_translation_status('Not available offline')
+        else:
+            self.set_translation_status('Failed to translate :(')
 
     def _on_translations_received(self, translations):
         '''Handle received translations'''
@@ -171,9 +189,11 @@ class LexemesContainer(QWidget):
             lexemes_limit: int = None,
             examples_limit: int = None,
             translations_limit: int = None,
+            pivot_index: Optional[PivotIndex] = None,
             parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.lexemes_limit = lexemes_limit
+        self.pivot_index = pivot_index
         self.examples_limit = examples_limit
         self.translations_limit = translations_limit
         self.layout = QVBoxLayout(self)
@@ -198,6 +218,7 @@ class LexemesContainer(QWidget):
                 word_class=word_class,
                 examples_limit=self.examples_limit,
                 translations_limit=self.translations_limit,
+                pivot_index=self.pivot_index,
                 parent=self
             )
             lexeme_widget.translations_updated.connect(self._on_child_translations_updated)
@@ -215,6 +236,25 @@ class LexemesContainer(QWidget):
         if len(lexemes) == 1:
             radio_button.hide()
 
+    def update_data(self, lexemes: List[LexemeInfo], word_class: str) -> bool:
+        '''Update displayed lexemes in place if they are the same ones, or rebuild the display.
+
+        Returns:
+            True if updated in place.
+        '''
+        lexemes = lexemes[:self.lexemes_limit]
+        same = (
+            [lexeme.lexeme_id for lexeme in lexemes]
+            == [widget.lexeme.lexeme_id for widget in self.lexeme_widgets]
+        )
+        if not same:
+            self.set_data(lexemes, word_class)
+            return False
+        for widget, lexeme in zip(self.lexeme_widgets, lexemes):
+            widget.word_class = word_class
+            widget.set_lexeme(lexeme)
+        return True
+
     def set_translation_language(self, lang):
         for widget in self.lexeme_widgets:
             widget.set_translation_language(lang)
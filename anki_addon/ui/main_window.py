@@ -1,28 +1,103 @@
+import os
+import logging
+import urllib.parse
 import anki.lang
 from aqt.qt import (
     pyqtSignal, Qt, QEvent, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QLineEdit,
     QPushButton, QButtonGroup, QStackedWidget, QScrollArea, QFrame, QMessageBox,
-    QCheckBox
+    QCheckBox, QTimer, QCompleter, QStringListModel
 )
-from aqt.operations import QueryOp
+from aqt.operations import QueryOp, CollectionOp
+from aqt.utils import tooltip
 from aqt.theme import theme_manager
 from aqt import mw, colors, gui_hooks
 
 from ..sonaveeb import Sonaveeb, SonaveebMode
 from ..notetypes import NoteTypeManager
-from ..globals import REQUEST_TIMEOUT
-from .word_info import WordInfoPanel
+from ..pivot import PivotIndex
+from ..lemma import LemmaIndex
+from ..fuzzy import FuzzyIndex
+from ..completion import CompletionIndex
+from ..note_index import NoteIndex
+from ..offline import MissQueue
+from ..migrations import migrate_legacy_notes
+from ..audio import run_audio_jobs
+from .. import operations
+from ..tracing import tracer
+from ..netstats import netstats, format_bytes, NetworkRefused, QuotaExceeded
+from ..globals import (
+    REQUEST_TIMEOUT,
+    USER_FILES_DIR,
+    NETWORK_REQUEST_QUOTA,
+    NETWORK_BYTES_QUOTA,
+    OFFLINE_FAILURE_THRESHOLD,
+    OFFLINE_PROBE_INTERVAL,
+    OFFLINE_FETCH_INTERVAL,
+)
+from .word_info import WordInfoPanel, warn_audio_errors
 from .common import VSeparator, ShrinkingComboBox
 
 
 class SonaveebDialog(QWidget):
-    def __init__(self, notetype_manager=None, sonaveeb=None, parent=None):
+    def __init__(
+            self,
+            notetype_manager=None,
+            sonaveeb=None,
+            pivot_index=None,
+            note_index=None,
+            lemma_index=None,
+            completion_index=None,
+            parent=None):
         super().__init__(parent=parent)
+        self._open_trace = tracer.begin('Open dialog')
         self._notetype_manager = notetype_manager or NoteTypeManager()
         self._sonaveeb = sonaveeb or Sonaveeb()
+        self._pivot_index = pivot_index or PivotIndex()
+        self._note_index = note_index or NoteIndex()
+        self._lemma_index = lemma_index or LemmaIndex()
+        # Known words for suggestions, built in background from the lemma and note
+        # indices when first needed, and rebuilt once notes are indexed
+        self._fuzzy_index = None
+        self._fuzzy_lemma_count = 0
+        self._fuzzy_loading = False
+        self._fuzzy_reload = False
+        # Known words are packed for completions once the search box is first edited
+        self._completion_index = completion_index or CompletionIndex()
+        self._completions_loading = False
+        # Words of existing notes are packed once the note index is ready
+        self._completions_note_count = None
+        self._pending_query = None
         self._config = mw.addonManager.getConfig(__name__)
+        if self._config.get('trace_log', False):
+            tracer.log_path = os.path.join(USER_FILES_DIR, 'traces.jsonl')
+        netstats.set_quotas(
+            requests=self._config.get('network_request_quota', NETWORK_REQUEST_QUOTA),
+            bytes=self._config.get('network_bytes_quota', NETWORK_BYTES_QUOTA),
+        )
+        netstats.quota_callbacks.append(lambda: mw.taskman.run_on_main(self._on_quota_exceeded))
+        netstats.failure_threshold = self._config.get('offline_failure_threshold', OFFLINE_FAILURE_THRESHOLD)
+        netstats.failure_host = urllib.parse.urlsplit(self._sonaveeb.BASE_URL).netloc
+        netstats.offline_callbacks.append(lambda: mw.taskman.run_on_main(self._on_went_offline))
+        # Lookups missed while offline are fetched one by one once back online
+        self._miss_queue = MissQueue()
+        self._fetching_miss = False
+        self._fetch_timer = QTimer(self)
+        self._fetch_timer.setInterval(OFFLINE_FETCH_INTERVAL)
+        self._fetch_timer.timeout.connect(self._fetch_next_miss)
+        # Connectivity is checked periodically if offline mode was enabled automatically
+        self._probing = False
+        self._probe_timer = QTimer(self)
+        self._probe_timer.setInterval(OFFLINE_PROBE_INTERVAL)
+        self._probe_timer.timeout.connect(self._probe_connectivity)
 
-        notetype_manager.create_missing_defaults()
+        # Deck and note type lists are read in the background once the dialog is shown.
+        # They are cached afterwards, and only re-read from the collection after
+        # they've been changed (see _on_operation_did_execute)
+        self._lists_loaded = False
+        self._decks_stale = False
+        self._notetypes_stale = False
+        # Pairs of intended note types and their pending updates
+        self._notetype_updates = None
 
         self.setWindowFlag(Qt.WindowType.Window)
         self.setWindowTitle('Sõnaveeb Deck Builder')
@@ -32,9 +107,9 @@ class SonaveebDialog(QWidget):
         # - Add deck selector
         self._deck_selector = ShrinkingComboBox()
         self._deck_selector.setMinimumWidth(100)
-        self._refresh_deck_list()
         self._deck_selector.currentIndexChanged.connect(self._on_deck_changed)
-        self._deck_selector.setPlaceholderText('None')
+        self._deck_selector.setPlaceholderText('Loading...')
+        self._deck_selector.setEnabled(False)
         deck_label = QLabel('&Deck:')
         deck_label.setStyleSheet(f'font-size: 10pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
         deck_label.setBuddy(self._deck_selector)
@@ -45,19 +120,27 @@ class SonaveebDialog(QWidget):
         # - Add note type selector
         self._notetype_selector = ShrinkingComboBox()
         self._notetype_selector.setMinimumWidth(100)
-        self._refresh_notetype_list()
         self._notetype_selector.currentIndexChanged.connect(self._on_notetype_changed)
-        self._notetype_selector.setPlaceholderText('None')
+        self._notetype_selector.setPlaceholderText('Loading...')
+        self._notetype_selector.setEnabled(False)
         notetype_label = QLabel('&Note Type:')
         notetype_label.setStyleSheet(f'font-size: 10pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
         notetype_label.setBuddy(self._notetype_selector)
         self._notetype_update_button = QPushButton('Apply Updates')
         self._notetype_update_button.setStyleSheet('font-size: 10pt')
         self._notetype_update_button.clicked.connect(self._apply_notetype_updates)
+        self._notetype_update_button.hide()
         notetype_title_layout = QHBoxLayout()
         notetype_title_layout.setContentsMargins(0, 0, 0, 0)
         notetype_title_layout.addWidget(notetype_label)
         notetype_title_layout.addWidget(self._notetype_update_button)
+        self._convert_notes_button = QPushButton('Convert Deck')
+        self._convert_notes_button.setStyleSheet('font-size: 10pt')
+        self._convert_notes_button.setToolTip(
+            'Convert all Sõnaveeb notes in the selected deck to the selected note type'
+        )
+        self._convert_notes_button.clicked.connect(self._convert_deck_notes)
+        notetype_title_layout.addWidget(self._convert_notes_button)
         notetype_layout = QVBoxLayout()
         notetype_layout.addLayout(notetype_title_layout)
         notetype_layout.addWidget(self._notetype_selector)
@@ -118,6 +201,23 @@ class SonaveebDialog(QWidget):
         audio_layout.addWidget(self._audio_checkbox)
         audio_layout.setAlignment(self._audio_checkbox, Qt.AlignmentFlag.AlignHCenter)
 
+        # - Add offline checkbox
+        offline_tooltip = (
+            'Use only cached data, and fetch the rest once back online.\n'
+            'Enabled automatically when Sõnaveeb is unreachable.'
+        )
+        self._offline_checkbox = QCheckBox()
+        self._offline_checkbox.toggled.connect(self._on_offline_changed)
+        self._offline_checkbox.setToolTip(offline_tooltip)
+        offline_label = QLabel('O&ffline:')
+        offline_label.setToolTip(offline_tooltip)
+        offline_label.setStyleSheet(f'font-size: 10pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
+        offline_label.setBuddy(self._offline_checkbox)
+        offline_layout = QVBoxLayout()
+        offline_layout.addWidget(offline_label)
+        offline_layout.addWidget(self._offline_checkbox)
+        offline_layout.setAlignment(self._offline_checkbox, Qt.AlignmentFlag.AlignHCenter)
+
         # - Populate header bar
         header_layout = QHBoxLayout()
         header_layout.addLayout(deck_layout)
@@ -130,6 +230,8 @@ class SonaveebDialog(QWidget):
         header_layout.addLayout(mode_layout)
         header_layout.addWidget(VSeparator(QFrame.Shadow.Sunken))
         header_layout.addLayout(audio_layout)
+        header_layout.addWidget(VSeparator(QFrame.Shadow.Sunken))
+        header_layout.addLayout(offline_layout)
         header_layout.setContentsMargins(10, 5, 10, 5)
         self._header_bar = QWidget()
         # CSS properties marked with "Native theme" comment simply duplicate
@@ -163,11 +265,23 @@ class SonaveebDialog(QWidget):
         self._search = QLineEdit()
         self._search.setFocus()
         self._search.returnPressed.connect(self._on_search_triggered)
+        self._search.textEdited.connect(self._on_search_text_edited)
+        # Completions are ranked by the index, so the completer must not filter them
+        self._completion_model = QStringListModel()
+        self._completer = QCompleter(self._completion_model, self)
+        self._completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self._completer.setWidget(self._search)
+        self._completer.activated.connect(self._on_completion_activated)
         self._search_button = QPushButton('Search')
         self._search_button.clicked.connect(self._on_search_triggered)
         search_layout = QHBoxLayout()
         search_layout.addWidget(self._search)
         search_layout.addWidget(self._search_button)
+        self._add_selected_button = QPushButton('Add Selected')
+        self._add_selected_button.setToolTip('Add notes for all selected words in a single step')
+        self._add_selected_button.hide()
+        self._add_selected_button.clicked.connect(self._add_selected_notes)
+        search_layout.addWidget(self._add_selected_button)
         search_layout.setAlignment(Qt.AlignmentFlag.AlignHCenter)
         search_layout.setContentsMargins(10, 5, 10, 5)
         search_bar = QWidget()
@@ -202,6 +316,21 @@ class SonaveebDialog(QWidget):
         self._content_stack.addWidget(self._status)
         self._content_stack.setCurrentWidget(self._status)
 
+        # Debug overlay with stage timings of the current search
+        self._trace_overlay = QLabel()
+        self._trace_overlay.setStyleSheet(f'font-family: monospace; font-size: 9pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
+        self._trace_overlay.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self._trace_overlay.setVisible(self._config.get('trace_overlay', False))
+        # Network usage of the current search and the session
+        self._network_label = QLabel()
+        self._network_label.setStyleSheet(f'font-size: 9pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
+        self._network_label.setAlignment(Qt.AlignmentFlag.AlignHCenter)
+        self._network_label.setTextFormat(Qt.TextFormat.RichText)
+        self._network_label.linkActivated.connect(self._on_network_link_activated)
+        self._stats_timer = QTimer(self)
+        self._stats_timer.timeout.connect(self._refresh_stats)
+        self._stats_timer.start(500)
+
         report_link = QLabel('See any mistakes or other problems? Please report <a href="https://github.com/azymohliad/anki-sonaveeb/issues">here</a>')
         report_link.setTextFormat(Qt.TextFormat.RichText)
         report_link.setTextInteractionFlags(Qt.TextInteractionFlag.TextBrowserInteraction)
@@ -213,6 +342,8 @@ class SonaveebDialog(QWidget):
         layout.addWidget(self._header_bar)
         layout.addWidget(search_bar)
         layout.addWidget(self._content_stack)
+        layout.addWidget(self._trace_overlay)
+        layout.addWidget(self._network_label)
         layout.addWidget(report_link)
         layout.setAlignment(search_bar, Qt.AlignmentFlag.AlignHCenter)
         layout.setContentsMargins(0, 0, 0, 5)
@@ -220,20 +351,16 @@ class SonaveebDialog(QWidget):
         self._search.setFocus()
         self.set_status('Search something :)')
 
-        self._apply_notetype_updates()
+        self._load_collection_lists()
         gui_hooks.theme_did_change.append(self._on_theme_changed)
+        gui_hooks.operation_did_execute.append(self._on_operation_did_execute)
+        gui_hooks.sync_did_finish.append(self._on_sync_did_finish)
+        self._legacy_notes_migrated = False
+        self._note_index.ready_callbacks.append(self._on_note_index_ready)
+        self._note_index.ensure_built()
 
         # Restore config
-        # - Deck
-        deck_id = self._config.get('deck')
-        index_deck = self._deck_selector.findData(deck_id)
-        if index_deck >= 0:
-            self._deck_selector.setCurrentIndex(index_deck)
-        # - Note Type
-        notetype = self._config.get('notetype')
-        index_notetype = self._notetype_selector.findData(notetype)
-        if index_notetype >= 0:
-            self._notetype_selector.setCurrentIndex(index_notetype)
+        # - Deck and note type are restored once their lists are loaded
         # - Translation language
         default_lang = anki.lang.get_def_lang()[1].split('_')[0]
         lang = self._config.get('language', default_lang)
@@ -249,10 +376,24 @@ class SonaveebDialog(QWidget):
         # - Audio
         save_audio = self._config.get('save_audio', False)
         self._audio_checkbox.setChecked(save_audio)
+        # - Offline mode. If it was enabled automatically earlier in this session,
+        #   it's only reflected, and connectivity checks are resumed
+        self._offline_checkbox.setChecked(self._config.get('offline', False))
+        if netstats.offline_automatically:
+            self._on_went_offline()
 
         # Track Google translate requests in progress
         self.pending_translation_requests = set()
 
+    def cleanup(self):
+        '''Detach the dialog from Anki hooks, e.g. when the profile is closed.'''
+        gui_hooks.theme_did_change.remove(self._on_theme_changed)
+        gui_hooks.operation_did_execute.remove(self._on_operation_did_execute)
+        gui_hooks.sync_did_finish.remove(self._on_sync_did_finish)
+        self._stats_timer.stop()
+        self._fetch_timer.stop()
+        self._probe_timer.stop()
+
     def language_code(self):
         return self._lang_selector.currentData()
 
@@ -284,27 +425,114 @@ class SonaveebDialog(QWidget):
             child = self._search_results_layout.takeAt(0)
             child.widget().deleteLater()
         self._lang_selector.setEnabled(True)
+        self._refresh_add_selected_button()
 
     def _request_search(self, query):
         self._search_button.setEnabled(False)
         self._mode_selector.setEnabled(False)
         self._search.setEnabled(False)
-        self.set_status('Searching...')
+        # A suggestion may be selected while the search is in progress
+        self._pending_query = query
+        tracer.begin(f'Search "{query}"')
+        # Known similar words are offered while Sõnaveeb is being searched
+        if not self._show_suggestions(query, 'Searching... Known similar words:'):
+            self.set_status('Searching...')
+        netstats.begin_search()
         operation = QueryOp(
             parent=self,
             op=lambda col: self._search_candidates(query, REQUEST_TIMEOUT),
-            success=self._on_search_results_received
-        ).failure(self._on_search_error)
+            success=lambda result: self._on_search_results_received(result, query)
+        ).failure(lambda error: self._on_search_error(error, query))
         operation.run_in_background()
 
     def _search_candidates(self, query, timeout=None):
-        match, forms = self._sonaveeb.get_base_form(query, timeout=timeout)
+        match, forms = self._resolve_base_form(query, timeout=timeout)
         if match is not None:
             references = self._sonaveeb.get_references(match, timeout=timeout)
         else:
             references = []
         return references, forms
 
+    def _load_completions(self):
+        # Known words are gathered here, and packed in background
+        self._completions_loading = True
+        words = [(word, 0) for word in self._lemma_index.words()]
+        # Words with notes rank above ones that were only looked up
+        if self._note_index.ready:
+            words += [(word, 1) for word in self._note_index.words()]
+            self._completions_note_count = len(self._note_index)
+        QueryOp(
+            parent=self,
+            op=lambda col: self._completion_index.build(words),
+            success=self._on_completions_loaded,
+        ).failure(self._on_completions_error).run_in_background()
+
+    def _on_completions_error(self, error):
+        self._completions_loading = False
+        logging.error(f'Failed to load completions: {error}')
+
+    def _resolve_base_form(self, query, timeout=None):
+        # Paradigms seen before resolve the query without asking Sõnaveeb if it's
+        # a known base form, or if Sõnaveeb can't be asked. Otherwise the query
+        # may also be a form of a word that wasn't seen yet, so both are merged.
+        with tracer.span('lemma_index.lookup'):
+            base_forms = self._lemma_index.base_forms(query)
+        match = next((f for f in base_forms if f.lower() == query.lower()), None)
+        if base_forms and (match is not None or not netstats.network_allowed()):
+            return match, [f for f in base_forms if f != match]
+        match, forms = self._sonaveeb.get_base_form(query, timeout=timeout)
+        return match, forms + [f for f in base_forms if f not in forms and f != match]
+
+    def _load_fuzzy_index(self):
+        # Known words are folded and indexed in background
+        if self._fuzzy_loading:
+            self._fuzzy_reload = True
+            return
+        self._fuzzy_loading = True
+        self._fuzzy_reload = False
+        lemma_count = len(self._lemma_index)
+        note_words = self._note_index.words() if self._note_index.ready else []
+
+        def build(col):
+            index = FuzzyIndex()
+            index.update(self._lemma_index.forms())
+            index.update((word, word) for word in note_words)
+            return index
+
+        QueryOp(
+            parent=self,
+            op=build,
+            success=lambda index: self._on_fuzzy_index_loaded(index, lemma_count),
+        ).failure(self._on_fuzzy_index_error).run_in_background()
+
+    def _on_fuzzy_index_loaded(self, index, lemma_count):
+        self._fuzzy_index = index
+        self._fuzzy_lemma_count = lemma_count
+        self._fuzzy_loading = False
+        if self._fuzzy_reload:
+            self._load_fuzzy_index()
+
+    def _on_fuzzy_index_error(self, error):
+        self._fuzzy_loading = False
+        logging.error(f'Failed to load known words for suggestions: {error}')
+
+    def _similar_words(self, query):
+        '''Known words similar to the query, e.g. typed without diacritics.
+
+        Empty until the known words are loaded in background.
+        '''
+        if self._fuzzy_index is None:
+            self._load_fuzzy_index()
+            return []
+        with tracer.span('fuzzy_index.update'):
+            # Lemma index only grows, so only newly indexed words are added,
+            # and there are few of them
+            if len(self._lemma_index) != self._fuzzy_lemma_count:
+                self._fuzzy_index.update(self._lemma_index.forms(start=self._fuzzy_lemma_count))
+                self._fuzzy_lemma_count = len(self._lemma_index)
+        with tracer.span('fuzzy_index.search'):
+            return self._fuzzy_index.search(query)
+
     def _save_config_value(self, key, value):
         self._config[key] = value
         mw.addonManager.writeConfig(__name__, self._config)
@@ -317,9 +545,51 @@ class SonaveebDialog(QWidget):
         else:
             self.set_status('Search something :)')
 
+    def _on_operation_did_execute(self, changes, handler):
+        if changes.deck:
+            self._decks_stale = True
+        if changes.notetype:
+            self._notetypes_stale = True
+            self._notetype_updates = None
+        if self.isActiveWindow():
+            self._refresh_stale_lists()
+
+    def _on_sync_did_finish(self):
+        self._decks_stale = True
+        self._notetypes_stale = True
+        self._notetype_updates = None
+        if self.isActiveWindow():
+            self._refresh_stale_lists()
+
     def _on_theme_changed(self):
         self._header_bar.setStyleSheet(f'background: {theme_manager.var(colors.CANVAS_ELEVATED)}')
 
+    def _on_search_text_edited(self, text):
+        if self._fuzzy_index is None and not self._fuzzy_loading:
+            self._load_fuzzy_index()
+        if not self._completion_index.ready:
+            if not self._completions_loading:
+                self._load_completions()
+            return
+        with tracer.span('completions'):
+            completions = self._completion_index.complete(text)
+        self._completion_model.setStringList(completions)
+        if completions:
+            self._completer.complete()
+        else:
+            self._completer.popup().hide()
+
+    def _on_completions_loaded(self, packed):
+        self._completion_index.set_packed(packed)
+        self._completions_loading = False
+        self._repack_completions()
+        if self._search.hasFocus() and self._search.text():
+            self._on_search_text_edited(self._search.text())
+
+    def _on_completion_activated(self, text):
+        self._search.setText(text)
+        self._on_search_triggered()
+
     def _on_form_selected(self, form):
         print(f'Selected form: {form}')
         self._search.setText(form)
@@ -342,6 +612,7 @@ class SonaveebDialog(QWidget):
         deck_id = self.deck_id()
         for word_panel in self.search_results():
             word_panel.set_deck_id(deck_id)
+        self._refresh_existing_notes()
         self._save_config_value('deck', deck_id)
 
     def _on_notetype_changed(self, _index):
@@ -356,15 +627,117 @@ class SonaveebDialog(QWidget):
             word_panel.set_audio_enabled(enabled)
         self._save_config_value('save_audio', enabled)
 
-    def _on_search_results_received(self, result):
+    def _on_offline_changed(self, offline):
+        # Only manual changes get here, automatic ones block the checkbox signals
+        netstats.set_offline(offline)
+        self._probe_timer.stop()
+        if offline:
+            self._fetch_timer.stop()
+        else:
+            self._fetch_timer.start()
+        self._save_config_value('offline', offline)
+        self._refresh_stats()
+
+    def _set_offline_checked(self, offline):
+        self._offline_checkbox.blockSignals(True)
+        self._offline_checkbox.setChecked(offline)
+        self._offline_checkbox.blockSignals(False)
+
+    def _on_went_offline(self):
+        self._set_offline_checked(True)
+        self._fetch_timer.stop()
+        self._probe_timer.start()
+        if self.isVisible():
+            tooltip('Sõnaveeb is unreachable, switched to offline mode', parent=self)
+
+    def _probe_connectivity(self):
+        if self._probing or not netstats.offline_automatically:
+            return
+        self._probing = True
+        QueryOp(
+            parent=self,
+            op=lambda col: self._sonaveeb.is_reachable(timeout=REQUEST_TIMEOUT),
+            success=self._on_probe_finished,
+        ).failure(self._on_probe_error).run_in_background()
+
+    def _on_probe_finished(self, reachable):
+        self._probing = False
+        # Offline mode might have been toggled manually in the meantime
+        if not reachable or not netstats.offline_automatically:
+            return
+        netstats.set_offline(False)
+        self._set_offline_checked(False)
+        self._probe_timer.stop()
+        self._fetch_timer.start()
+        if self.isVisible():
+            tooltip('Sõnaveeb is reachable again, switched to online mode', parent=self)
+
+    def _on_probe_error(self, error):
+        self._probing = False
+        logging.warning(f'Connectivity check failed: {error}')
+
+    def _fetch_next_miss(self):
+        if self._fetching_miss:
+            return
+        if not netstats.network_allowed():
+            self._fetch_timer.stop()
+            return
+        item = self._miss_queue.pop()
+        if item is None:
+            self._fetch_timer.stop()
+            return
+        key, fetch = item
+        self._fetching_miss = True
+        QueryOp(
+            parent=self,
+            op=lambda col: fetch(),
+            success=lambda _: self._on_miss_fetched(key),
+        ).failure(lambda error: self._on_miss_fetch_error(key, fetch, error)).run_in_background()
+
+    def _on_miss_fetched(self, key):
+        self._fetching_miss = False
+        kind, target = key
+        if kind == 'search':
+            # Show results of the search if it's still awaited
+            awaited = not self.search_results() and self._search.text().strip() == target
+            if awaited and self._search.isEnabled():
+                self._on_search_triggered()
+        elif kind == 'word':
+            for panel in self.search_results():
+                if panel.word_info is None and panel.word_reference.url == target:
+                    panel.request_word_info()
+
+    def _on_miss_fetch_error(self, key, fetch, error):
+        self._fetching_miss = False
+        if isinstance(error, NetworkRefused) or netstats.offline:
+            # Offline again, keep it for later
+            self._miss_queue.add(key, fetch)
+            self._fetch_timer.stop()
+        else:
+            logging.warning(f'Failed to fetch {key[0]} "{key[1]}" queued while offline: {error}')
+
+    def _on_word_fetch_deferred(self):
+        reference = self.sender().word_reference
+        self._miss_queue.add(
+            ('word', reference.url),
+            lambda: self._sonaveeb.get_word_info_by_reference(reference, timeout=REQUEST_TIMEOUT),
+        )
+
+    def _on_search_results_received(self, result, query):
+        if query != self._pending_query:
+            # Superseded by another search
+            return
         references, forms = result
+        if references or forms:
+            self._completion_index.record(query)
         self._search_button.setEnabled(True)
         self._mode_selector.setEnabled(True)
         self._search.setEnabled(True)
         self._search.setFocus()
         if len(references) == 0:
             if len(forms) == 0:
-                self.set_status('Not found :(')
+                if not self._show_suggestions(query, 'Not found, did you mean:'):
+                    self.set_status('Not found :(')
             elif len(forms) == 1:
                 self._request_search(forms[0])
             else:
@@ -373,25 +746,199 @@ class SonaveebDialog(QWidget):
                 self._form_selector.show()
                 self._content_stack.setCurrentWidget(self._content)
         else:
+            # Known similar words, e.g. with diacritics, are suggested too
+            names = {r.name for r in references}
+            forms = forms + [
+                w for w in self._similar_words(query) if w not in forms and w not in names
+            ]
             self._form_selector.set_options(forms)
             self._form_selector.set_label('See also:')
             self._form_selector.setVisible(len(forms) > 0)
             self._content_stack.setCurrentWidget(self._content)
             notetype = mw.col.models.get(self.notetype_id())
             for reference in references:
-                word_panel = WordInfoPanel(reference, self._sonaveeb, self.deck_id(), notetype, self.language_code())
+                word_panel = WordInfoPanel(
+                    reference, self._sonaveeb, self.deck_id(), notetype, self.language_code(),
+                    pivot_index=self._pivot_index,
+                    note_index=self._note_index,
+                    lemma_index=self._lemma_index,
+                )
                 word_panel.set_audio_enabled(self.audio_enabled())
                 word_panel.translations_requested.connect(self._on_word_translation_requested)
+                word_panel.selection_changed.connect(self._refresh_add_selected_button)
+                word_panel.fetch_deferred.connect(self._on_word_fetch_deferred)
                 self._search_results_layout.addWidget(word_panel)
 
-    def _on_search_error(self, error):
-        print(error)
-        self.set_status('Search failed :(\nPlease retry')
+    def _repack_completions(self):
+        # Pack words of existing notes if they weren't indexed when the words were packed
+        stale = (
+            self._completion_index.ready
+            and self._note_index.ready
+            and len(self._note_index) != self._completions_note_count
+        )
+        if stale and not self._completions_loading:
+            self._load_completions()
+
+    def _on_note_index_ready(self):
+        self._refresh_existing_notes()
+        self._repack_completions()
+        if self._fuzzy_index is not None or self._fuzzy_loading:
+            # Add words of existing notes to suggestions
+            self._load_fuzzy_index()
+        self._migrate_legacy_notes()
+
+    def _migrate_legacy_notes(self):
+        # Notes created by older versions are migrated once, with the user's
+        # consent, so that looking them up doesn't require regex searches
+        if self._legacy_notes_migrated:
+            return
+        note_ids = self._note_index.outdated_note_ids()
+        if not note_ids:
+            return
+        # Asked once per session, legacy notes are still found if declined
+        self._legacy_notes_migrated = True
+        answer = QMessageBox.question(
+            self,
+            'Update Sõnaveeb notes?',
+            f'{len(note_ids)} Sõnaveeb notes were created by an older version of the addon. '
+            'Would you like to update their URL and Word ID fields to the current format?',
+            QMessageBox.StandardButton.Yes,
+            QMessageBox.StandardButton.No
+        )
+        if answer == QMessageBox.StandardButton.No:
+            return
+        CollectionOp(
+            parent=self,
+            op=lambda col: migrate_legacy_notes(col, note_ids)
+        ).success(
+            lambda out: tooltip(f'Updated {out.count} Sõnaveeb notes to the current format', parent=self)
+        ).with_progress('Migrating Sõnaveeb notes').run_in_background()
+
+    def _refresh_existing_notes(self):
+        # Resolve notes for all loaded results at once
+        panels = [p for p in self.search_results() if p.word_info is not None]
+        if not panels or self.deck_id() is None:
+            return
+        with tracer.span('notes.lookup'):
+            found = self._note_index.find_many([p.word_info for p in panels], self.deck_id())
+        for panel in panels:
+            panel.set_existing_note(found.get(panel.word_info.word_id))
+
+    def _refresh_add_selected_button(self):
+        count = len([p for p in self.search_results() if p.is_selected()])
+        self._add_selected_button.setText(f'Add Selected ({count})')
+        self._add_selected_button.setVisible(count > 0)
+
+    def _add_selected_notes(self):
+        # Add notes for all selected words as a single undoable collection operation,
+        # with their audio downloaded concurrently beforehand in background, so that
+        # the collection isn't held during downloads
+        panels = [p for p in self.search_results() if p.is_selected()]
+        if not panels:
+            return
+        deck_id = self.deck_id()
+        notes = [panel.new_note() for panel in panels]
+        audio_jobs = [
+            job for panel, note in zip(panels, notes)
+            if (job := panel.audio_job(note)) is not None
+        ]
+        audio_errors = []
+
+        def on_audio_saved(errors):
+            audio_errors.extend(errors)
+            # The note index is kept current by note hooks
+            CollectionOp(
+                parent=self,
+                op=lambda col: operations.add_notes(col, notes, deck_id)
+            ).success(on_success).failure(on_failure).with_progress(
+                'Adding Sõnaveeb notes'
+            ).run_in_background(initiator=self._note_index)
+
+        def on_success(_changes):
+            for panel in panels:
+                panel.finish_note_operation()
+            tooltip(f'Added {len(notes)} notes', parent=self)
+            if audio_errors:
+                warn_audio_errors(self, audio_errors)
+
+        def on_failure(error):
+            for panel in panels:
+                panel.finish_note_operation(failed=True)
+            QMessageBox.warning(self, 'Failed to add the notes', str(error))
+
+        for panel, note in zip(panels, notes):
+            panel.set_selected(False)
+            panel.begin_note_operation(note)
+        if not audio_jobs:
+            on_audio_saved([])
+            return
+        QueryOp(
+            parent=self,
+            op=lambda col: run_audio_jobs(audio_jobs),
+            success=on_audio_saved,
+        ).failure(lambda error: on_audio_saved([error])).run_in_background()
+
+    def _refresh_stats(self):
+        if not self.isVisible():
+            return
+        if self._trace_overlay.isVisible() and tracer.current is not None:
+            self._trace_overlay.setText(tracer.current.summary())
+        search, session = netstats.totals()
+        text = (
+            f'Network: {search.requests} requests ({format_bytes(search.bytes)}) this search, '
+            f'{session.requests} requests ({format_bytes(session.bytes)}) this session'
+        )
+        if netstats.offline:
+            text += ' &mdash; offline, using cached data only'
+            if queued := len(self._miss_queue):
+                text += f', {queued} lookups queued'
+        elif netstats.cache_only:
+            text += ' &mdash; quota exceeded, using cached data only (<a href="resume">resume</a>)'
+        self._network_label.setText(text)
+        self._network_label.setToolTip(netstats.summary())
+
+    def _on_network_link_activated(self, link):
+        if link == 'resume':
+            netstats.resume()
+            self._refresh_stats()
+
+    def _on_quota_exceeded(self):
+        if self.isVisible():
+            tooltip('Network quota exceeded, only cached data will be used', parent=self)
+
+    def _on_search_error(self, error, query):
+        logging.error(f'Search failed: {error}')
+        if query != self._pending_query:
+            return
+        if netstats.offline and not isinstance(error, QuotaExceeded):
+            # Either refused in offline mode, or failed and switched to it
+            self._miss_queue.add(
+                ('search', query), lambda: self._search_candidates(query, REQUEST_TIMEOUT)
+            )
+            if not self._show_suggestions(query, 'Offline, known similar words:'):
+                self.set_status('Not available offline :(\nIt will be searched once back online')
+        elif isinstance(error, QuotaExceeded):
+            if not self._show_suggestions(query, 'Network quota exceeded, known similar words:'):
+                self.set_status('Network quota exceeded :(\nOnly cached data is available')
+        elif not self._show_suggestions(query, 'Search failed, known similar words:'):
+            self.set_status('Search failed :(\nPlease retry')
         self._search_button.setEnabled(True)
         self._mode_selector.setEnabled(True)
         self._search.setEnabled(True)
         self._search.setFocus()
 
+    def _show_suggestions(self, query, label):
+        # Offer known words similar to the query instead of search results.
+        # Returns False if there are none.
+        suggestions = self._similar_words(query)
+        if not suggestions:
+            return False
+        self._form_selector.set_label(label)
+        self._form_selector.set_options(suggestions)
+        self._form_selector.show()
+        self._content_stack.setCurrentWidget(self._content)
+        return True
+
     def _on_word_translation_requested(self, active):
         widget = self.sender()
         if active:
@@ -421,8 +968,11 @@ class SonaveebDialog(QWidget):
         if combobox.currentIndex() == -1 and combobox.count() > 0:
             combobox.setCurrentIndex(0)
 
-    def _refresh_notetype_list(self):
-        notetypes = self._notetype_manager.get_valid_notetypes()
+    def _refresh_notetype_list(self, notetypes=None):
+        if notetypes is None:
+            notetypes = self._notetype_manager.get_valid_notetypes()
+        else:
+            notetypes = [nt for nt in notetypes if self._notetype_manager.is_notetype_valid(nt)]
         items = [(nt['name'], nt['id']) for nt in notetypes]
         self._refresh_combobox(self._notetype_selector, items)
 
@@ -430,16 +980,108 @@ class SonaveebDialog(QWidget):
         decks = mw.col.decks.all_names_and_ids()
         items = [(d.name, d.id) for d in decks]
         self._refresh_combobox(self._deck_selector, items)
+        self._decks_stale = False
+
+    def _refresh_notetypes(self):
+        # A single note type query serves both the list and the updates check
+        notetypes = self._notetype_manager.get_intended_notetypes()
+        self._refresh_notetype_list(notetypes)
+        self._check_notetypes_updates(notetypes)
+        self._notetypes_stale = False
 
-    def _check_notetypes_updates(self):
+    def _load_collection_lists(self):
+        QueryOp(
+            parent=self,
+            op=self._read_collection_lists,
+            success=self._on_collection_lists_loaded
+        ).failure(self._on_collection_lists_error).run_in_background()
+
+    def _read_collection_lists(self, col):
+        missing_defaults = self._notetype_manager.get_missing_defaults()
+        decks = col.decks.all_names_and_ids()
         notetypes = self._notetype_manager.get_intended_notetypes()
-        updates = [self._notetype_manager.get_pending_update(n) for n in notetypes]
-        available = any([not u.is_empty() for u in updates])
+        updates = [(nt, self._notetype_manager.get_pending_update(nt)) for nt in notetypes]
+        return missing_defaults, decks, updates
+
+    def _on_collection_lists_loaded(self, result):
+        missing_defaults, decks, updates = result
+        # Note types are created on the main thread, and then re-read
+        self._notetype_manager.create_missing_defaults(missing_defaults)
+        if missing_defaults:
+            updates = None
+        # Fill selectors without saving the first items into the config
+        self._deck_selector.blockSignals(True)
+        self._notetype_selector.blockSignals(True)
+        self._refresh_combobox(self._deck_selector, [(d.name, d.id) for d in decks])
+        if updates is None:
+            self._refresh_notetypes()
+        else:
+            self._refresh_notetype_list([nt for nt, _ in updates])
+            self._notetype_updates = updates
+            self._check_notetypes_updates()
+        self._restore_selector(self._deck_selector, self._config.get('deck'))
+        self._restore_selector(self._notetype_selector, self._config.get('notetype'))
+        self._deck_selector.blockSignals(False)
+        self._notetype_selector.blockSignals(False)
+        for selector in [self._deck_selector, self._notetype_selector]:
+            selector.setPlaceholderText('None')
+            selector.setEnabled(True)
+        self._lists_loaded = True
+        # Catch up search results that were loaded in the meantime
+        deck_id = self.deck_id()
+        notetype = mw.col.models.get(self.notetype_id()) if self.notetype_id() else None
+        for word_panel in self.search_results():
+            word_panel.set_deck_id(deck_id)
+            word_panel.set_notetype(notetype)
+        self._refresh_existing_notes()
+        elapsed = self._open_trace.elapsed
+        self._open_trace.add('dialog.time_to_interactive', elapsed)
+        logging.info(f'Sõnaveeb dialog is interactive in {elapsed * 1000:.1f} ms')
+        self._apply_notetype_updates()
+
+    def _on_collection_lists_error(self, error):
+        logging.error(f'Failed to load decks and note types: {error}')
+        self._deck_selector.setPlaceholderText('None')
+        self._notetype_selector.setPlaceholderText('None')
+
+    def _restore_selector(self, combobox, data):
+        index = combobox.findData(data)
+        if index >= 0:
+            combobox.setCurrentIndex(index)
+
+    def _refresh_stale_lists(self):
+        if not self._lists_loaded:
+            return
+        if self._decks_stale:
+            self._refresh_deck_list()
+        if self._notetypes_stale:
+            self._refresh_notetypes()
+
+    def _pending_notetype_updates(self, notetypes=None):
+        if self._notetype_updates is None or notetypes is not None:
+            if notetypes is None:
+                notetypes = self._notetype_manager.get_intended_notetypes()
+            self._notetype_updates = [
+                (nt, self._notetype_manager.get_pending_update(nt)) for nt in notetypes
+            ]
+        return self._notetype_updates
+
+    def _check_notetypes_updates(self, notetypes=None):
+        updates = self._pending_notetype_updates(notetypes)
+        available = any([not u.is_empty() for _, u in updates])
         self._notetype_update_button.setVisible(available)
 
     def _apply_notetype_updates(self):
-        notetypes = self._notetype_manager.get_intended_notetypes()
-        updates = [self._notetype_manager.get_pending_update(n) for n in notetypes]
+        pending = self._pending_notetype_updates()
+        notetypes = [nt for nt, _ in pending]
+        updates = [u for _, u in pending]
+        # Note types that are already current only get their fingerprints
+        # written, so that their content isn't compared on every check
+        for notetype, update in pending:
+            if update.is_empty() and not self._notetype_manager.is_notetype_up_to_date(notetype):
+                self._notetype_manager.update_notetype(notetype, update)
+        if all([u.is_empty() for u in updates]):
+            return
         required = any([u.is_required() for u in updates])
         can_or_need = 'need to' if required else 'can'
         if any([u.is_consequential() for u in updates]):
@@ -486,29 +1128,64 @@ class SonaveebDialog(QWidget):
                 QMessageBox.StandardButton.No
             )
             if answer == QMessageBox.StandardButton.No:
+                # Keep the updates available for later
+                self._notetype_update_button.show()
                 return
         # Apply updates
         for notetype, update in zip(notetypes, updates):
             if not update.is_empty():
-                self._notetype_manager.update_notetype(notetype)
-        # Hide update button
-        self._notetype_update_button.hide()
-        self._refresh_notetype_list()
+                self._notetype_manager.update_notetype(notetype, update)
+        # Note types are updated directly rather than via collection operations,
+        # so the cached lists are refreshed here
+        self._notetype_updates = None
+        self._refresh_notetypes()
+
+    def _convert_deck_notes(self):
+        deck_id = self.deck_id()
+        notetype_id = self.notetype_id()
+        if deck_id is None or notetype_id is None:
+            return
+        # Only convert between valid note types, so that all fields map by name
+        other_notetype_ids = [
+            nt['id'] for nt in self._notetype_manager.get_valid_notetypes()
+            if nt['id'] != notetype_id
+        ]
+        if not other_notetype_ids:
+            return
+        deck = mw.col.decks.get(deck_id)['name']
+        notetypes = ' OR '.join(f'mid:{mid}' for mid in other_notetype_ids)
+        note_ids = mw.col.find_notes(f'deck:"{deck}" ({notetypes})')
+        if not note_ids:
+            tooltip('No Sõnaveeb notes to convert in this deck', parent=self)
+            return
+        notetype_name = self._notetype_selector.currentText()
+        answer = QMessageBox.question(
+            self,
+            'Convert notes?',
+            f'Convert {len(note_ids)} Sõnaveeb notes in "{deck}" to "{notetype_name}"?',
+            QMessageBox.StandardButton.Yes,
+            QMessageBox.StandardButton.No
+        )
+        if answer == QMessageBox.StandardButton.No:
+            return
+        # Changing note types requires a one-way sync
+        if not mw.confirm_schema_modification():
+            return
+        CollectionOp(
+            parent=self,
+            op=lambda col: operations.convert_notes(col, note_ids, notetype_id)
+        ).success(
+            lambda out: tooltip(f'Converted {out.count} Sõnaveeb notes', parent=self)
+        ).with_progress('Converting Sõnaveeb notes').run_in_background()
 
     # QWidget overrides
     def changeEvent(self, event):
         if event.type() == QEvent.Type.ActivationChange:
             if self.isActiveWindow():
-                # Window activated
-                # On a laptop with NVMe SSD and a relatively small Anki database
-                # these checks usually take approximately 0.5 ms, while a single
-                # database query within them is usually between 0.05 to 0.15 ms.
-                # Theoretically, one note type DB query could be optimized away,
-                # and reused for _refresh_notetype_list and _check_notetypes_updates,
-                # but it's probably not worth the added complexity.
-                self._refresh_deck_list()
-                self._refresh_notetype_list()
-                self._check_notetypes_updates()
+                # Window activated, catch up with changes made while it was inactive.
+                # Nothing is read from the collection unless something has changed.
+                self._refresh_stale_lists()
+                self._note_index.ensure_built()
 
 
 class SelectorRow(QWidget):
@@ -2,13 +2,17 @@ import logging
 import anki.errors
 from aqt.qt import (
     Qt, QSizePolicy, QWidget, QHBoxLayout, QVBoxLayout, QLabel, QPushButton,
-    QStackedWidget, QGroupBox, QMessageBox, QStyle, pyqtSignal
+    QStackedWidget, QGroupBox, QMessageBox, QStyle, QCheckBox, pyqtSignal
 )
-from aqt.operations import QueryOp
+from aqt.operations import QueryOp, CollectionOp
 from aqt.theme import theme_manager
 from aqt import mw, colors
 
 from ..notetypes import NoteTypeManager
+from ..note_index import search_notes
+from .. import operations
+from ..tracing import tracer
+from ..netstats import netstats, NetworkRefused
 from ..globals import (
     REQUEST_TIMEOUT,
     TRANSLATIONS_LIMIT,
@@ -18,13 +22,27 @@ from ..globals import (
 
 
 from .lexeme import LexemesContainer, LexemeWidget
-from ..audio import AudioManager
+from ..audio import AudioManager, run_audio_jobs
 
 
 class WordInfoPanel(QGroupBox):
     translations_requested = pyqtSignal(bool)
-
-    def __init__(self, word_reference, sonaveeb, deck_id, notetype, lang, parent=None):
+    # Emitted when the panel may have been selected or deselected for batch adding
+    selection_changed = pyqtSignal()
+    # Emitted when word info isn't cached and can't be fetched while offline
+    fetch_deferred = pyqtSignal()
+
+    def __init__(
+            self,
+            word_reference,
+            sonaveeb,
+            deck_id,
+            notetype,
+            lang,
+            pivot_index=None,
+            note_index=None,
+            lemma_index=None,
+            parent=None):
         super().__init__(parent=parent)
         # Set state
         self.deck_id = deck_id
@@ -34,8 +52,12 @@ class WordInfoPanel(QGroupBox):
         self.word_info = None
         self.note = None
         self._sonaveeb = sonaveeb
+        self._pivot_index = pivot_index
+        self._note_index = note_index
+        self._lemma_index = lemma_index
         self._audio_enabled = False
-        self._audio_download_in_progress = False
+        self._note_operation_in_progress = False
+        self._previous_note_id = None
 
         # Add status label
         self._status_label = QLabel()
@@ -52,10 +74,15 @@ class WordInfoPanel(QGroupBox):
         self._pronounce_button.setIcon(play_icon)
         self._pronounce_button.setFixedWidth(30)
         self._pronounce_button.clicked.connect(self._on_pronounce_button_clicked)
+        # Marks data shown from the local cache until it's confirmed by Sõnaveeb
+        self._cached_label = QLabel('cached')
+        self._cached_label.setStyleSheet(f'font-size: 9pt; color: {theme_manager.var(colors.FG_SUBTLE)}')
+        self._cached_label.hide()
         title_layout = QHBoxLayout()
         title_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
         title_layout.addWidget(self._title_label)
         title_layout.addWidget(self._pronounce_button)
+        title_layout.addWidget(self._cached_label)
         self._morphology_label = QLabel()
         self._morphology_label.setTextFormat(Qt.TextFormat.MarkdownText)
         self._class_label = QLabel()
@@ -65,12 +92,17 @@ class WordInfoPanel(QGroupBox):
         self._lexemes_container = LexemesContainer(
             lexemes_limit=LEXEMES_LIMIT,
             examples_limit=EXAMPLES_LIMIT,
-            translations_limit=TRANSLATIONS_LIMIT
+            translations_limit=TRANSLATIONS_LIMIT,
+            pivot_index=pivot_index
         )
         self._lexemes_container.lexeme_selected.connect(self._on_lexeme_selected)
         self._lexemes_container.translations_updated.connect(self._on_translations_updated)
         self._lexemes_container.translations_requested.connect(self.translations_requested)
 
+        self._select_checkbox = QCheckBox('Select')
+        self._select_checkbox.setToolTip('Select to add together with other words')
+        self._select_checkbox.hide()
+        self._select_checkbox.toggled.connect(self.selection_changed)
         self._add_button = QPushButton('Add')
         self._add_button.setFixedWidth(100)
         self._add_button.hide()
@@ -95,6 +127,7 @@ class WordInfoPanel(QGroupBox):
 
         buttons_layout = QVBoxLayout()
         buttons_layout.setAlignment(Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignRight)
+        buttons_layout.addWidget(self._select_checkbox, 0, Qt.AlignmentFlag.AlignRight)
         buttons_layout.addWidget(self._add_button, 0, Qt.AlignmentFlag.AlignRight)
         buttons_layout.addWidget(self._delete_button, 0, Qt.AlignmentFlag.AlignRight)
         buttons_layout.addWidget(self._replace_button, 0, Qt.AlignmentFlag.AlignRight)
@@ -125,13 +158,13 @@ class WordInfoPanel(QGroupBox):
         self.setLayout(layout)
         self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Maximum)
 
+        # Initialize audio handler
+        self.audio_manager = AudioManager(request_timeout=REQUEST_TIMEOUT)
+
         # Request word info
         self.set_notetype(notetype)
         self.request_word_info()
 
-        # Initialize audio handler
-        self.audio_manager = AudioManager(request_timeout=REQUEST_TIMEOUT)
-
     def set_translation_language(self, lang):
         '''Set translation language.
 
@@ -143,10 +176,11 @@ class WordInfoPanel(QGroupBox):
         self.refresh_buttons()
 
     def set_deck_id(self, deck_id):
-        '''Set deck ID.'''
+        '''Set deck ID.
+
+        Existing note is not re-read, use `set_existing_note` or `read_existing_note` for that.
+        '''
         self.deck_id = deck_id
-        if self.word_info is not None:
-            self.read_existing_note()
 
     def set_notetype(self, notetype):
         self.notetype = notetype
@@ -154,6 +188,7 @@ class WordInfoPanel(QGroupBox):
 
     def set_audio_enabled(self, enabled: bool):
         self._audio_enabled = enabled
+        self.prefetch_audio()
         self.refresh_buttons()
 
     def set_status(self, status):
@@ -165,33 +200,50 @@ class WordInfoPanel(QGroupBox):
         '''Set word information and update display.'''
         self.word_info = data
         # Update content
-        self._title_label.setText(f'<a href="{data.url}"><h3>{data.word}</h3></a>')
-        self._morphology_label.setText(f'**Forms**: {data.essential_forms(compress=True, join=True)}')
-        self._class_label.setText(f'**Class**: {data.word_class}')
-        self._class_label.setVisible(data.word_class is not None)
+        self._set_word_labels(data)
         self._lexemes_container.set_data(data.lexemes, data.word_class)
         self._stack.setCurrentWidget(self._content)
-        self._pronounce_button.setVisible(bool(data.word_audio_url))
-        # Request translations
+        # Request translations and audio
         self.set_translation_language(self.lang)
+        self.prefetch_audio()
         # Update buttons state
         self.read_existing_note()
 
+    def update_word_info(self, data):
+        '''Update displayed word information in place, e.g. once cached data is refreshed.
+
+        Widgets are only rebuilt if the lexemes themselves have changed.
+        '''
+        self.word_info = data
+        self._set_word_labels(data)
+        if not self._lexemes_container.update_data(data.lexemes, data.word_class):
+            self.set_translation_language(self.lang)
+        self.prefetch_audio()
+        self.read_existing_note()
+
+    def _set_word_labels(self, data):
+        self._title_label.setText(f'<a href="{data.url}"><h3>{data.word}</h3></a>')
+        self._morphology_label.setText(f'**Forms**: {data.essential_forms(compress=True, join=True)}')
+        self._class_label.setText(f'**Class**: {data.word_class}')
+        self._class_label.setVisible(data.word_class is not None)
+        self._pronounce_button.setVisible(bool(data.word_audio_url))
+
     def read_existing_note(self):
         '''Read note for the current word if already exists.
         '''
-        if self.word_info is None:
+        if self.word_info is None or self.deck_id is None:
             return
-        deck = mw.col.decks.get(self.deck_id)['name']
-        queries = [
-            f'"Word ID:{self.word_info.word_id}"',
-            f'URL:"{self.word_info.url}"',
-            f'"URL:re:{self.word_info.legacy_url_regex()}"',
-        ]
-        for query in queries:
-            if notes := mw.col.find_notes(f'{query} deck:"{deck}"'):
-                self.note = mw.col.get_note(notes[0])
-                break
+        with tracer.span('notes.lookup'):
+            if self._note_index is not None:
+                found = self._note_index.find_many([self.word_info], self.deck_id)
+            else:
+                found = search_notes(mw.col, [self.word_info], self.deck_id)
+        self.set_existing_note(found.get(self.word_info.word_id))
+
+    def set_existing_note(self, note_id):
+        '''Set existing note for the current word, or None if there is none.
+        '''
+        self.note = mw.col.get_note(note_id) if note_id is not None else None
         self.refresh_buttons()
 
     def refresh_buttons(self):
@@ -209,6 +261,7 @@ class WordInfoPanel(QGroupBox):
             translations_ok = False
 
         # Update visibility
+        self._select_checkbox.setVisible(not note_exists)
         self._add_button.setVisible(not note_exists)
         self._replace_button.setVisible(note_exists and not note_updated)
         self._delete_button.setVisible(note_exists)
@@ -218,9 +271,10 @@ class WordInfoPanel(QGroupBox):
             notetype_ok
             and translations_ok
             and not translating
-            and not self._audio_download_in_progress
+            and not self._note_operation_in_progress
         )
-        delete_enabled = not self._audio_download_in_progress
+        delete_enabled = not self._note_operation_in_progress
+        self._select_checkbox.setEnabled(update_enabled)
         self._add_button.setEnabled(update_enabled)
         self._replace_button.setEnabled(update_enabled)
         self._delete_button.setEnabled(delete_enabled)
@@ -233,11 +287,23 @@ class WordInfoPanel(QGroupBox):
             tooltips.append('No translations')
         if translating:
             tooltips.append('Translation is in progress')
-        if self._audio_download_in_progress:
-            tooltips.append('Downloading audio')
+        if self._note_operation_in_progress:
+            tooltips.append('Saving the note')
         tooltip = '\n'.join(tooltips)
         self._add_button.setToolTip(tooltip)
         self._replace_button.setToolTip(tooltip)
+        self.selection_changed.emit()
+
+    def is_selected(self):
+        '''Check whether the panel is selected for batch adding, and its note can be added.'''
+        return (
+            self._select_checkbox.isChecked()
+            and self._select_checkbox.isVisibleTo(self)
+            and self._select_checkbox.isEnabled()
+        )
+
+    def set_selected(self, selected: bool):
+        self._select_checkbox.setChecked(selected)
 
     def is_note_content_updated(self):
         '''Check if existing note matches the current word info.'''
@@ -276,55 +342,51 @@ class WordInfoPanel(QGroupBox):
 
     def add_note(self):
         '''Add a new note to the collection'''
-        note = mw.col.new_note(self.notetype)
-        self.fill_note(note)
-        mw.col.add_note(note, self.deck_id)
-        self.note = note
-        if self._audio_enabled:
-            self.save_audio()
-        else:
-            self.refresh_buttons()
+        note = self.new_note()
+        deck_id = self.deck_id
+        self.commit_note(
+            note,
+            write=lambda col: col.add_note(note, deck_id),
+            error_title='Failed to add the note',
+        )
 
     def update_note(self):
         '''Update an existing note with current data'''
         if self.note is not None:
             # Update note content
             # TODO: Check if note content is different
-            self.fill_note(self.note)
+            note = self.note
+            self.fill_note(note)
             if not self._audio_enabled:
                 # TODO: Should audio files be manually removed?
                 # What if another note from another deck refers
                 # to the same audio files?
-                self.note['Audio'] = ''
-            mw.col.update_note(self.note)
-            # Update note type if needed
-            old_ntid = self.note.mid
-            new_ntid = self.notetype.get('id')
-            if old_ntid != new_ntid:
-                info = mw.col.models.change_notetype_info(old_notetype_id=old_ntid, new_notetype_id=new_ntid)
-                request = info.input
-                print(request.note_ids)
-                request.note_ids.extend([self.note.id])
-                mw.col.models.change_notetype_of_notes(request)
-            # Re-read updated note from DB
-            self.note = mw.col.get_note(self.note.id)
-            # Download audio if needed but missing
-            if self._audio_enabled and not self.note['Audio']:
-                self.save_audio()
-            else:
-                self.refresh_buttons()
+                note['Audio'] = ''
+            notetype_id = self.notetype.get('id')
+            self.commit_note(
+                note,
+                write=lambda col: operations.update_note(col, note, notetype_id),
+                # Fields are remapped when the note type changes
+                reread=note.mid != notetype_id,
+                error_title='Failed to update the note',
+            )
 
     def delete_note(self):
         if self.note is not None:
             # TODO: Should audio files be manually deleted?
-            results = mw.col.remove_notes([self.note.id])
-            if results.count == 0:
-                raise RuntimeError(
-                    'Your database appears to be in an inconsistent state.'
-                    ' Please use the Check Database action.')
-            else:
-                self.note = None
-        self.refresh_buttons()
+            note_id = self.note.id
+            self.begin_note_operation(None)
+            self._run_note_operation(
+                op=lambda col: operations.remove_note(col, note_id),
+                success=lambda _: self.finish_note_operation(),
+                error_title='Failed to delete the note',
+            )
+
+    def new_note(self):
+        '''Create a new note filled with current data, without adding it to the collection.'''
+        note = mw.col.new_note(self.notetype)
+        self.fill_note(note)
+        return note
 
     def fill_note(self, note):
         '''Fill note with current lexeme data'''
@@ -357,6 +419,17 @@ class WordInfoPanel(QGroupBox):
         return fields, tags
 
     def request_word_info(self):
+        # Cached data is shown right away, and refreshed in background if stale
+        with tracer.span('cache.read'):
+            cached = self._sonaveeb.get_cached_word_info(self.word_reference)
+        if cached is not None:
+            word_info, stale = cached
+            self._on_word_info_received(word_info)
+            self._set_cached(True, stale)
+            if stale and netstats.network_allowed():
+                self.revalidate_word_info()
+            return
+        self._set_cached(False)
         self.set_status('Loading...')
         operation = QueryOp(
             parent=self,
@@ -367,57 +440,181 @@ class WordInfoPanel(QGroupBox):
         ).failure(self._on_word_request_error)
         operation.run_in_background()
 
-    def save_audio(self):
-        self._buttons_status_label.setText('Downloading audio...')
-        self._buttons_status_label.show()
-        self._audio_download_in_progress = True
-        self.refresh_buttons()
-        operation = QueryOp(
+    def revalidate_word_info(self):
+        QueryOp(
             parent=self,
-            op=lambda col: self.audio_manager.save(
-                self.word_info.audio_urls(),
-                self.word_info.word,
-                self.word_info.word_id
+            op=lambda col: self._sonaveeb.revalidate_word_info(
+                self.word_reference, timeout=REQUEST_TIMEOUT
             ),
-            success=self._on_audio_received
-        ).failure(self._on_save_audio_error)
-        operation.run_in_background()
+            success=self._on_word_info_revalidated
+        ).failure(
+            lambda error: logging.warning(f'Failed to refresh cached word info: {error}')
+        ).run_in_background()
+
+    def prefetch_audio(self):
+        '''Download pronunciation audio in advance, so that saving a note doesn't wait for it.'''
+        if not self._audio_enabled or self.word_info is None:
+            return
+        urls = self.word_info.audio_urls()
+        QueryOp(
+            parent=self,
+            op=lambda col: [self.audio_manager.get_audio_file(url) for url in urls],
+            success=lambda _: None
+        ).failure(
+            lambda error: logging.warning(f'Failed to prefetch audio: {error}')
+        ).run_in_background()
 
-    # Slots & callbacks
+    def audio_job(self, note):
+        '''Get a function that saves audio into the media folder and fills the note's Audio field.
 
-    def _on_word_request_error(self, error):
-        logging.error(f'Word request failed: {error}')
-        self.set_status('Error :(')
+        The function is intended to run in background. Returns None if no audio needs to be saved.
+        '''
+        if not self._audio_enabled or note['Audio']:
+            return None
+        urls = self.word_info.audio_urls()
+        word = self.word_info.word
+        word_id = self.word_info.word_id
 
-    def _on_word_info_received(self, word_info):
+        def job():
+            note['Audio'] = ' '.join(self.audio_manager.save(urls, word, word_id))
+        return job
+
+    def commit_note(self, note, write, reread=False, error_title='Failed to save the note'):
+        '''Gather all note content, and write the note in a single operation.
+
+        Audio is saved into the media folder in background first, so the note
+        doesn't need to be updated again afterwards, and the collection isn't
+        held while it's downloaded. If audio can't be saved, the note is
+        written without it.
+
+        Args:
+            note: Note filled with the current data.
+            write: Function that writes the note into the collection.
+            reread: Whether to re-read the note from the collection afterwards.
+        '''
+        audio_jobs = [job for job in [self.audio_job(note)] if job is not None]
+
+        def on_audio_saved(audio_errors):
+            def on_success(_changes):
+                self.finish_note_operation(reread=reread)
+                if audio_errors and self._is_alive():
+                    warn_audio_errors(self, audio_errors)
+            self._run_note_operation(op=write, success=on_success, error_title=error_title)
+
+        self.begin_note_operation(note)
+        if not audio_jobs:
+            on_audio_saved([])
+            return
+        QueryOp(
+            parent=mw,
+            op=lambda col: run_audio_jobs(audio_jobs),
+            success=on_audio_saved,
+        ).failure(lambda error: on_audio_saved([error])).run_in_background()
+
+    def begin_note_operation(self, note):
+        '''Show the expected note state while a write operation is in progress.
+
+        Args:
+            note: The note as it will be after the operation, or None if it will be removed.
+        '''
+        self._previous_note_id = self.note.id if self.note is not None else None
+        self.note = note
+        self._note_operation_in_progress = True
+        self._buttons_status_label.setText('Saving...')
+        self._buttons_status_label.show()
+        self.refresh_buttons()
+
+    def finish_note_operation(self, reread=False, failed=False):
+        '''Reconcile the note state once a write operation is completed.
+
+        Args:
+            reread: Whether to re-read the note from the collection.
+            failed: Whether the operation failed, in which case
+                the previous note is restored from the collection.
+        '''
+        self._note_operation_in_progress = False
+        if not self._is_alive():
+            return
+        self._buttons_status_label.hide()
+        if failed:
+            try:
+                self.note = mw.col.get_note(self._previous_note_id) if self._previous_note_id else None
+            except anki.errors.NotFoundError:
+                self.note = None
+        elif reread and self.note is not None:
+            self.note = mw.col.get_note(self.note.id)
+        self.refresh_buttons()
+
+    def _run_note_operation(self, op, success, error_title):
+        # Run a collection write operation in the background
+        def on_failure(error):
+            logging.error(f'{error_title}: {error}')
+            self.finish_note_operation(failed=True)
+            if self._is_alive():
+                QMessageBox.warning(self, error_title, str(error))
+
+        # The note index is kept current by note hooks, so there's no need
+        # for it to rebuild after this operation. The panel may have been
+        # deleted while audio was being saved, but the note is written anyway.
+        CollectionOp(
+            parent=self if self._is_alive() else mw,
+            op=op
+        ).success(success).failure(on_failure).with_progress().run_in_background(
+            initiator=self._note_index
+        )
+
+    def _set_cached(self, cached, stale=False):
+        self._cached_label.setVisible(cached)
+        if stale:
+            self._cached_label.setToolTip('Loaded from the local cache, may be outdated')
+        else:
+            self._cached_label.setToolTip('Loaded from the local cache')
+
+    def _is_alive(self):
         # Test if this widget still exists
         try:
             self.isVisible()
         except RuntimeError:
             # Panel was deleted
+            return False
+        return True
+
+    # Slots & callbacks
+
+    def _on_word_request_error(self, error):
+        logging.error(f'Word request failed: {error}')
+        if not self._is_alive():
+            return
+        if isinstance(error, NetworkRefused):
+            self.set_status('Not available offline')
+            self.fetch_deferred.emit()
+        else:
+            self.set_status('Error :(')
+
+    def _on_word_info_received(self, word_info):
+        if not self._is_alive():
             return
         if word_info is None:
             self.set_status('Failed to obtain word info :(')
         else:
+            if self._pivot_index is not None:
+                self._pivot_index.add(word_info)
+            if self._lemma_index is not None:
+                self._lemma_index.add(word_info)
             self.set_word_info(word_info)
 
-    def _on_save_audio_error(self, error):
-        self._audio_download_in_progress = False
-        self._buttons_status_label.hide()
-        self.refresh_buttons()
-        logging.error(f'Failed to save audio: {error}')
-        QMessageBox.warning(self, 'Oops...', f'Failed to save pronunciation audio.')
-
-    def _on_audio_received(self, audio_refs):
-        self._audio_download_in_progress = False
-        self._buttons_status_label.hide()
-        if self.note is not None:
-            self.note['Audio'] = ' '.join(audio_refs)
-            try:
-                mw.col.update_note(self.note)
-            except anki.errors.NotFoundError as e:
-                QMessageBox.warning(self, 'Failed to add audio', str(e))
-        self.refresh_buttons()
+    def _on_word_info_revalidated(self, word_info):
+        if not self._is_alive():
+            return
+        self._set_cached(False)
+        if word_info is None:
+            # Cached data is up to date
+            return
+        if self._pivot_index is not None:
+            self._pivot_index.add(word_info)
+        if self._lemma_index is not None:
+            self._lemma_index.add(word_info)
+        self.update_word_info(word_info)
 
     def _on_pronounce_button_clicked(self):
         self._pronounce_button.setEnabled(False)
@@ -437,16 +634,10 @@ class WordInfoPanel(QGroupBox):
         self.add_note()
 
     def _on_delete_button_clicked(self):
-        try:
-            self.delete_note()
-        except RuntimeError as e:
-            QMessageBox.warning(self, 'Failed to delete the note', str(e))
+        self.delete_note()
 
     def _on_replace_button_clicked(self):
-        try:
-            self.update_note()
-        except anki.errors.NotFoundError as e:
-            QMessageBox.warning(self, 'Failed to update the note', str(e))
+        self.update_note()
 
     def _on_lexeme_selected(self):
         '''Handle lexeme selection'''
@@ -455,3 +646,12 @@ class WordInfoPanel(QGroupBox):
     def _on_translations_updated(self, lexeme_widget: LexemeWidget):
         if self._lexemes_container.get_selected_widget() is lexeme_widget:
             self.refresh_buttons()
+
+
+def warn_audio_errors(parent, errors):
+    '''Notify that some notes were saved without pronunciation audio.'''
+    if len(errors) == 1:
+        message = 'Failed to save pronunciation audio, the note was saved without it.'
+    else:
+        message = f'Failed to save pronunciation audio for {len(errors)} notes, they were saved without it.'
+    QMessageBox.warning(parent, 'Oops...', message)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+'''Benchmark search box completions over a large number of known words.
+
+Reports the time to pack the words, their memory footprint and the
+latency of completing random prefixes of known words, with short
+prefixes reported separately.
+'''
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+sys.path.append(ADDON_PATH)
+
+from completion import CompletionIndex, PRECOMPUTED_PREFIX_LENGTH
+
+LETTERS = 'abdeghijklmnoprstuvõäöü'
+
+
+def percentile(values, fraction):
+    return sorted(values)[int(fraction * (len(values) - 1))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Completion benchmark')
+    parser.add_argument('--words', type=int, default=300000, help='Number of known words')
+    parser.add_argument('--queries', type=int, default=10000, help='Number of prefixes to complete')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Short words, e.g. "ma" or "öö", are prefixes of many others
+    words = [
+        ''.join(rng.choice(LETTERS) for _ in range(rng.randint(1, 12)))
+        for _ in range(args.words)
+    ]
+    index = CompletionIndex()
+
+    started_at = time.perf_counter()
+    packed = index.build((word, rng.randint(0, 5)) for word in words)
+    build_time = time.perf_counter() - started_at
+    del packed
+
+    tracemalloc.start()
+    packed = index.build((word, 1) for word in words)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    index.set_packed(packed)
+    for word in rng.sample(words, 100):
+        index.record(word)
+
+    latencies = []
+    for word in rng.sample(words, args.queries):
+        prefix = word[:rng.randint(1, 5)]
+        started_at = time.perf_counter()
+        index.complete(prefix)
+        latencies.append(time.perf_counter() - started_at)
+
+    # Short prefixes match too many words to rank on every keystroke,
+    # so their completions must be precomputed
+    short_latencies = []
+    for word in rng.sample(words, args.queries):
+        prefix = word[:rng.randint(1, PRECOMPUTED_PREFIX_LENGTH)]
+        started_at = time.perf_counter()
+        index.complete(prefix)
+        short_latencies.append(time.perf_counter() - started_at)
+
+    print(f'{len(packed)} words packed in {build_time:.2f} s, {size / len(packed):.1f} bytes per word')
+    print(f'Completion latency: p50 {percentile(latencies, 0.5) * 1000:.3f} ms, '
+          f'p99 {percentile(latencies, 0.99) * 1000:.3f} ms, max {max(latencies) * 1000:.3f} ms')
+    print(f'Short prefix latency: p50 {percentile(short_latencies, 0.5) * 1000:.3f} ms, '
+          f'max {max(short_latencies) * 1000:.3f} ms, {len(packed._top)} prefixes precomputed')
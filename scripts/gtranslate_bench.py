@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import timeit
+import argparse
+
+import bs4
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'gtranslate_mobile.html')
+sys.path.append(ADDON_PATH)
+
+import gtranslate
+
+
+def parse_with_bs4(page):
+    dom = bs4.BeautifulSoup(page, 'html.parser')
+    if result := dom.find('div', class_='result-container'):
+        result = result.string
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Benchmark Google Translate result extraction')
+    parser.add_argument('--fixture', default=FIXTURE_PATH, help='Saved Google Translate mobile page')
+    parser.add_argument('--number', type=int, default=200, help='Number of parses per measurement')
+    args = parser.parse_args()
+
+    with open(args.fixture, 'r', encoding='utf-8') as file:
+        page = file.read()
+
+    expected = parse_with_bs4(page)
+    actual = gtranslate.extract_result(page)
+    if actual != expected:
+        sys.exit(f'Extraction mismatch: {actual!r} != {expected!r}')
+
+    for name, func in [('bs4', parse_with_bs4), ('extract_result', gtranslate.extract_result)]:
+        best = min(timeit.repeat(lambda: func(page), number=args.number, repeat=5))
+        print(f'{name:>16}: {best / args.number * 1e6:10.1f} us per page')
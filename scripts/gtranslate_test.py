@@ -8,6 +8,8 @@ ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
 sys.path.append(ADDON_PATH)
 
 import gtranslate
+import http_fixtures
+import profiling
 
 
 if __name__ == '__main__':
@@ -16,11 +18,17 @@ if __name__ == '__main__':
     parser.add_argument('--source-lang', default='et', help='Source language (ISO-639 code)')
     parser.add_argument('--target-lang', default='en', help='Target language (ISO-639 code)')
     parser.add_argument('--debug', action='store_true', help='Save HTML page before parsing for debugging')
+    http_fixtures.add_arguments(parser)
+    profiling.add_arguments(parser)
     args = parser.parse_args()
 
-    result = gtranslate.translate(
-        text=args.text,
-        target_lang=args.target_lang,
-        source_lang=args.source_lang,
-        debug=args.debug)
+    translator = gtranslate.GoogleTranslator()
+    http_fixtures.install(translator.session, args)
+    result = profiling.run(
+        lambda: translator.translate(
+            text=args.text,
+            target_lang=args.target_lang,
+            source_lang=args.source_lang,
+            debug=args.debug),
+        args)
     print(result)
@@ -0,0 +1,94 @@
+'''
+Offline HTTP for the developer scripts.
+
+Requests can be served from a directory of saved pages, or from a local
+fixture server serving such a directory (e.g. `python -m http.server -d DIR`).
+Pages fetched live can be recorded into such a directory.
+'''
+
+import os
+import urllib.parse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+
+def page_path(url):
+    '''Path of a saved page relative to the fixtures directory.'''
+    parts = urllib.parse.urlsplit(url)
+    path = urllib.parse.unquote(parts.path).strip('/')
+    if parts.query:
+        path += '?' + urllib.parse.unquote(parts.query)
+    name = urllib.parse.quote(path, safe='') or 'index'
+    return os.path.join(parts.netloc, f'{name}.html')
+
+
+class FixtureAdapter(BaseAdapter):
+    '''Serves requests from a directory of saved pages, or from a fixture server.'''
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def send(self, request, **kwargs):
+        path = page_path(request.url)
+        if self.source.startswith(('http://', 'https://')):
+            url = f'{self.source.rstrip("/")}/{urllib.parse.quote(path.replace(os.sep, "/"))}'
+            upstream = requests.get(url, timeout=kwargs.get('timeout'))
+            status, content = upstream.status_code, upstream.content
+        else:
+            try:
+                with open(os.path.join(self.source, path), 'rb') as file:
+                    status, content = 200, file.read()
+            except FileNotFoundError:
+                status, content = 404, b''
+        response = requests.Response()
+        response.status_code = status
+        response._content = content
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    '''Saves successfully fetched pages into a directory.'''
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            path = os.path.join(self.directory, page_path(request.url))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(response.content)
+        return response
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('offline')
+    source = group.add_mutually_exclusive_group()
+    source.add_argument('--html-dir', help='Serve requests from a directory of saved pages')
+    source.add_argument('--fixture-server', help='Serve requests from a local fixture server URL')
+    source.add_argument('--record', metavar='DIR', help='Save fetched pages into a directory')
+
+
+def install(session, args):
+    '''Mount adapters on the session according to the command line arguments.
+
+    Returns:
+        True if requests are served offline.
+    '''
+    if args.html_dir or args.fixture_server:
+        adapter = FixtureAdapter(args.html_dir or args.fixture_server)
+    elif args.record:
+        adapter = RecordingAdapter(args.record)
+    else:
+        return False
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return not args.record
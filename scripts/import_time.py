@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+'''Measure the overhead the addon adds to Anki launch.
+
+The addon's __init__.py and the modules it imports at module level are
+parsed to find everything that gets imported at launch. Modules provided by
+Anki itself (anki, aqt) are already loaded by then, so only the rest is
+imported in a fresh interpreter and timed.
+
+Pass --rev to compare with another revision, e.g. `--rev HEAD~1`.
+'''
+
+import os
+import ast
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_PATH = os.path.join(os.path.dirname(__file__), os.pardir)
+ADDON_DIR = 'anki_addon'
+# Modules already loaded by Anki by the time addons are imported
+HOST_MODULES = {'anki', 'aqt'}
+
+MEASURE_CODE = '''
+import sys, json, time
+start = time.perf_counter()
+for name in json.loads(sys.argv[1]):
+    __import__(name)
+print(json.dumps(time.perf_counter() - start))
+'''
+
+
+def read_source(rev, path):
+    if rev is None:
+        full_path = os.path.join(REPO_PATH, path)
+        if not os.path.exists(full_path):
+            return None
+        with open(full_path, 'r', encoding='utf-8') as file:
+            return file.read()
+    result = subprocess.run(
+        ['git', 'show', f'{rev}:{path}'],
+        cwd=REPO_PATH, capture_output=True, text=True
+    )
+    return result.stdout if result.returncode == 0 else None
+
+
+def module_path(rev, package, name):
+    # Resolve an addon module name (e.g. "ui.main_window") into its source path
+    base = '/'.join([ADDON_DIR] + [p for p in [package, name.replace('.', '/')] if p])
+    for path in [f'{base}.py', f'{base}/__init__.py']:
+        if read_source(rev, path) is not None:
+            return path
+    return None
+
+
+def top_level_imports(tree):
+    # Import statements executed at import time, excluding ones inside functions
+    nodes = list(tree.body)
+    while nodes:
+        node = nodes.pop(0)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+        elif isinstance(node, (ast.If, ast.Try)):
+            nodes.extend(node.body)
+            nodes.extend(getattr(node, 'orelse', []))
+            for handler in getattr(node, 'handlers', []):
+                nodes.extend(handler.body)
+
+
+def collect_startup_imports(rev):
+    '''Find addon modules and external modules imported at launch.'''
+    external = set()
+    visited = set()
+    queue = [f'{ADDON_DIR}/__init__.py']
+    while queue:
+        path = queue.pop()
+        if path in visited:
+            continue
+        visited.add(path)
+        package = os.path.dirname(path)[len(ADDON_DIR) + 1:].replace('/', '.')
+        tree = ast.parse(read_source(rev, path))
+        for node in top_level_imports(tree):
+            if isinstance(node, ast.Import):
+                external.update(alias.name for alias in node.names)
+                continue
+            if node.level == 0:
+                external.add(node.module)
+                continue
+            # Relative import, resolve against the current package
+            parts = package.split('.') if package else []
+            parts = parts[:len(parts) - (node.level - 1)]
+            prefix = '.'.join(parts)
+            names = [node.module] if node.module else [alias.name for alias in node.names]
+            for name in names:
+                target = module_path(rev, prefix, name)
+                if target is not None:
+                    queue.append(target)
+    external = {m for m in external if m.split('.')[0] not in HOST_MODULES}
+    return sorted(visited), sorted(external)
+
+
+def measure(modules, repeat):
+    # Import in fresh interpreters, so that nothing is cached between runs
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', MEASURE_CODE, json.dumps(modules)],
+            capture_output=True, text=True, check=True
+        )
+        timings.append(json.loads(result.stdout))
+    return min(timings)
+
+
+def report(label, rev, repeat):
+    addon_modules, external = collect_startup_imports(rev)
+    elapsed = measure(external, repeat)
+    print(f'{label}:')
+    print(f'  addon modules: {", ".join(addon_modules)}')
+    print(f'  external modules: {", ".join(external) or "-"}')
+    print(f'  import time: {elapsed * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Measure addon launch import overhead')
+    parser.add_argument('--rev', help='Git revision to compare with')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of measurements (the best is reported)')
+    args = parser.parse_args()
+
+    if args.rev is not None:
+        report(args.rev, args.rev, args.repeat)
+    report('Working tree', None, args.repeat)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+'''Generate synthetic Sõnaveeb pages for offline runs of the developer scripts.
+
+The pages only mimic the structure the scraper relies on, with made-up
+content. Only the Lite mode URLs are generated.
+'''
+
+import os
+import json
+import random
+import argparse
+import urllib.parse
+
+from http_fixtures import page_path
+
+BASE_URL = 'https://sonaveeb.ee'
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'sonaveeb')
+LANGS = ['en', 'ru', 'uk', 'fi', 'de']
+FORMS = [
+    'ainsuse nimetav', 'ainsuse omastav', 'ainsuse osastav', 'mitmuse nimetav',
+    'mitmuse omastav', 'mitmuse osastav', 'ainsuse sisseütlev', 'ainsuse seesütlev',
+    'ainsuse seestütlev', 'ainsuse alaleütlev', 'ainsuse alalütlev', 'ainsuse alaltütlev',
+    'ainsuse saav', 'ainsuse rajav', 'ainsuse olev', 'ainsuse ilmaütlev', 'ainsuse kaasaütlev',
+]
+
+
+def text(rng, words):
+    return ' '.join(rng.choice(['sõna', 'keel', 'maja', 'tuba', 'ilus', 'suur', 'käima']) for _ in range(words))
+
+
+def lexeme_html(rng, word, lexeme_id, marker):
+    translations = ''.join(
+        f'<div id="matches-show-more-panel-{lexeme_id}-{lang}">'
+        f'<span class="lang-code">{lang}</span><ul>'
+        + ''.join(
+            f'<li><a href="#"><span>{lang}_{word}_{i}</span></a></li>'
+            for i in range(rng.randint(1, 4))
+        )
+        + '</ul></div>'
+        for lang in LANGS
+    )
+    definitions = ''.join(
+        f'<span class="definition-value">{text(rng, 6)} &lt;eki-stress&gt;{word}&lt;/eki-stress&gt; '
+        f'<eki-form>{text(rng, 2)}</eki-form> {text(rng, 4)}</span>'
+        for _ in range(rng.randint(1, 2))
+    )
+    examples = ''.join(
+        f'<span class="example-text"><span>{text(rng, 8)}.</span></span>'
+        for _ in range(rng.randint(1, 5))
+    )
+    synonyms = ''.join(
+        f'<a class="synonym" href="#"><span>{text(rng, 1)}</span></a>'
+        for _ in range(rng.randint(0, 3))
+    )
+    return (
+        f'<div id="lexeme-section-{lexeme_id}" class="lexeme">'
+        f'<span class="lexeme-level">{marker}</span>'
+        f'<div class="definition-row"><span title="Keeleoskustase"> A{rng.randint(1, 2)} </span>{definitions}</div>'
+        f'{translations}{examples}'
+        f'<div class="rekts-est"><span class="lang-code--unrestricted">keda/mida</span></div>'
+        f'{synonyms}</div>'
+    )
+
+
+def details_html(rng, word, homonym_nr):
+    lexemes = []
+    for i in range(1, rng.randint(2, 5)):
+        lexemes.append(lexeme_html(rng, word, rng.randint(10**5, 10**6), f'{i}'))
+        if rng.random() < 0.5:
+            lexemes.append(lexeme_html(rng, word, rng.randint(10**5, 10**6), f'{i}.1'))
+    cells = ''.join(
+        f'<tr><td><span class="form-value-field" title="{form} - {form[:3]}">{word}{suffix}</span>'
+        f'<button class="btn-speaker" data-audio-url="/files/audio/{word}_{i}.mp3"></button></td></tr>'
+        for i, (form, suffix) in enumerate(zip(FORMS, ['', 'e', 'et', 'ed', 'ede', 'esid'] + ['ega'] * 11))
+    )
+    return (
+        '<html><body>'
+        f'<input id="selected-word-homonym-nr" value="{word}-{homonym_nr}-et">'
+        '<div class="word-results"><div><div>'
+        f'<span class="search__lex-title"><span>{word}</span></span>'
+        f'<button class="btn-speaker" data-audio-url="/files/audio/{word}.mp3"></button>'
+        '<span class="lang-code--unrestricted">nimisõna</span>'
+        '</div></div>'
+        f'{"".join(lexemes)}'
+        f'<div class="morphology-paradigm"><table>{cells}</table></div>'
+        '</div></body></html>'
+    )
+
+
+def search_html(word, homonyms):
+    items = ''.join(
+        '<li class="homonym-list-item">'
+        f'<a class="homonym-item" href="/search/lite/dlall/{urllib.parse.quote(word)}/{nr}/et"></a>'
+        '<span class="lang-code">et</span>'
+        '<div class="homonym__body">'
+        f'<div class="text-body-two"><span><span>{word}</span></span></div>'
+        f'<div class="homonym__text"><span class="homonym__matches">en_{word}</span><p>{word} {nr}</p></div>'
+        '</div></li>'
+        for nr in range(1, homonyms + 1)
+    )
+    return f'<html><body><ul>{items}</ul></body></html>'
+
+
+def write(directory, url, content):
+    path = os.path.join(directory, page_path(url))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
+
+def generate(directory, count, seed=0):
+    '''Write pages for the given number of words into a directory.
+
+    Returns:
+        List of generated words.
+    '''
+    rng = random.Random(seed)
+    words = [f'sõna{i:03}' for i in range(count)]
+    write(directory, BASE_URL, '<html><body></body></html>')
+    for word in words:
+        homonyms = rng.randint(1, 3)
+        write(directory, f'{BASE_URL}/searchwordfrag/lite/{word}',
+              json.dumps(dict(prefWords=[word], formWords=[])))
+        write(directory, f'{BASE_URL}/search/lite/dlall/{word}', search_html(word, homonyms))
+        for nr in range(1, homonyms + 1):
+            write(directory, f'{BASE_URL}/search/lite/dlall/{word}/{nr}/et', details_html(rng, word, nr))
+    return words
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Generate synthetic Sõnaveeb pages')
+    parser.add_argument('--output', default=FIXTURES_PATH, help='Output directory')
+    parser.add_argument('--words', type=int, default=5, help='Number of words')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    words = generate(args.output, args.words, args.seed)
+    print(f'Generated pages for {len(words)} words in {args.output}: {", ".join(words)}')
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+'''Measure memory used by parsed Sõnaveeb entries held in memory.
+
+Parses saved pages (see make_sonaveeb_fixtures.py) and reports bytes per
+cached entry for the current WordInfo, for plain dataclasses without slots
+or interned strings (as used before), and for the serialized form.
+'''
+
+import os
+import sys
+import glob
+import argparse
+import tracemalloc
+import urllib.parse
+import typing as tp
+import dataclasses as dc
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+sys.path.append(ADDON_PATH)
+
+import bs4
+from sonaveeb import Sonaveeb, WordInfo
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'sonaveeb')
+
+
+@dc.dataclass
+class PlainLexemeInfo:
+    lexeme_id: int
+    definitions: tp.List[str] = dc.field(default_factory=list)
+    rection: tp.List[str] = dc.field(default_factory=list)
+    synonyms: tp.List[str] = dc.field(default_factory=list)
+    translations: tp.Dict[str, tp.List[str]] = dc.field(default_factory=dict)
+    examples: tp.List[str] = dc.field(default_factory=list)
+    marker: str = None
+    level: str = None
+
+
+@dc.dataclass
+class PlainWordInfo:
+    word_id: str = None
+    word: str = None
+    word_class: str = None
+    word_audio_url: str = None
+    url: str = None
+    lexemes: tp.List[PlainLexemeInfo] = None
+    morphology: tp.Dict[str, str] = dc.field(default_factory=dict)
+    morphology_audio_urls: tp.Dict[str, str] = dc.field(default_factory=dict)
+
+
+def copy_str(value):
+    # Fresh copy of a string, as produced by parsing a separate page
+    return None if value is None else ''.join(list(value))
+
+
+def to_plain(info):
+    return PlainWordInfo(
+        word_id=copy_str(info.word_id),
+        word=copy_str(info.word),
+        word_class=copy_str(info.word_class),
+        word_audio_url=copy_str(info.word_audio_url),
+        url=copy_str(info.url),
+        lexemes=[
+            PlainLexemeInfo(
+                lexeme_id=lexeme.lexeme_id,
+                definitions=[copy_str(s) for s in lexeme.definitions],
+                rection=[copy_str(s) for s in lexeme.rection],
+                synonyms=[copy_str(s) for s in lexeme.synonyms],
+                translations={
+                    copy_str(lang): [copy_str(s) for s in words]
+                    for lang, words in lexeme.translations.items()
+                },
+                examples=[copy_str(s) for s in lexeme.examples],
+                marker=copy_str(lexeme.marker),
+                level=copy_str(lexeme.level),
+            )
+            for lexeme in info.lexemes
+        ],
+        morphology={copy_str(k): copy_str(v) for k, v in info.morphology.items()},
+        morphology_audio_urls={copy_str(k): copy_str(v) for k, v in info.morphology_audio_urls.items()},
+    )
+
+
+def parse_pages(directory):
+    sv = Sonaveeb()
+    entries = []
+    pattern = os.path.join(directory, 'sonaveeb.ee', 'search%2Flite%2Fdlall%2F*%2F*%2F*.html')
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as file:
+            dom = bs4.BeautifulSoup(file.read(), 'html.parser')
+        info = sv._parse_word_info(dom)
+        name = urllib.parse.unquote(os.path.basename(path)[:-len('.html')])
+        info.url = f'https://sonaveeb.ee/{urllib.parse.quote(name)}'
+        entries.append(info)
+    return entries
+
+
+def measure(build, count):
+    '''Bytes allocated per entry by objects built and kept alive.'''
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(kept)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('WordInfo memory benchmark')
+    parser.add_argument('--html-dir', default=FIXTURES_PATH, help='Directory of saved pages')
+    parser.add_argument('--entries', type=int, default=2000, help='Number of cached entries to simulate')
+    args = parser.parse_args()
+
+    samples = parse_pages(args.html_dir)
+    if not samples:
+        sys.exit(f'No word pages found in {args.html_dir}')
+    blobs = [info.to_bytes() for info in samples]
+    assert all(WordInfo.from_bytes(b) == info for b, info in zip(blobs, samples))
+
+    pick = lambda i: i % len(samples)
+    results = [
+        ('plain dataclasses', measure(lambda i: to_plain(samples[pick(i)]), args.entries)),
+        ('slotted, interned', measure(lambda i: WordInfo.from_bytes(blobs[pick(i)]), args.entries)),
+        ('serialized', measure(lambda i: bytes(bytearray(blobs[pick(i)])), args.entries)),
+    ]
+    print(f'{args.entries} entries from {len(samples)} pages')
+    baseline = results[0][1]
+    for name, size in results:
+        print(f'{name:>20}: {size:8.0f} bytes per entry ({size / baseline:.0%})')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+'''Check that looked up entries don't keep parse trees alive.
+
+Looks up a number of generated fixture words, keeps the results the way
+the dialog keeps them in its panels, and fails if any BeautifulSoup
+objects remain reachable.
+'''
+
+import os
+import gc
+import sys
+import argparse
+import tempfile
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+sys.path.append(ADDON_PATH)
+
+import bs4
+from sonaveeb import Sonaveeb
+from http_fixtures import FixtureAdapter
+import make_sonaveeb_fixtures
+
+
+def foreign_strings(value, path='info'):
+    '''Yield paths of str subclass instances within nested entry fields.'''
+    if isinstance(value, str):
+        if type(value) is not str:
+            yield f'{path}: {type(value).__name__}'
+    elif isinstance(value, (list, tuple)):
+        for i, item in enumerate(value):
+            yield from foreign_strings(item, f'{path}[{i}]')
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from foreign_strings(key, f'{path} key')
+            yield from foreign_strings(item, f'{path}[{key!r}]')
+    elif hasattr(value, '__slots__'):
+        for name in value.__slots__:
+            yield from foreign_strings(getattr(value, name), f'{path}.{name}')
+
+
+def dom_objects():
+    gc.collect()
+    return [o for o in gc.get_objects() if isinstance(o, (bs4.PageElement, bs4.BeautifulSoup))]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Parse tree retention check')
+    parser.add_argument('--lookups', type=int, default=100, help='Number of words to look up')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        words = make_sonaveeb_fixtures.generate(directory, args.lookups)
+        sv = Sonaveeb()
+        adapter = FixtureAdapter(directory)
+        sv.session.mount('https://', adapter)
+        sv.session.cookies.set('ww-sess', 'fixture')
+
+        baseline = len(dom_objects())
+        results = []
+        for word in words:
+            references = sv.get_references(word)
+            results.append((references, sv.get_word_info_by_reference(references[0])))
+
+    errors = [
+        error
+        for references, info in results
+        for item in references + [info]
+        for error in foreign_strings(item)
+    ]
+    retained = len(dom_objects()) - baseline
+    print(f'{len(results)} lookups, {retained} parse tree objects retained, '
+          f'{len(errors)} non-plain strings in results')
+    for error in errors[:10]:
+        print(f'  {error}')
+    if retained or errors:
+        sys.exit(1)
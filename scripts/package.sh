@@ -6,5 +6,5 @@ VERSION=$(cd "$REPO_DIR" && git describe)
 
 cd "$ADDON_DIR"
 rm -rf **/__pycache__ __pycache__ meta.json
-zip -r ../sonaveeb_integration_$VERSION.ankiaddon *
+zip -r ../sonaveeb_integration_$VERSION.ankiaddon * -x "user_files/*"
 
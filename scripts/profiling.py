@@ -0,0 +1,146 @@
+'''
+Profiling mode for the developer scripts.
+
+Runs a function under cProfile, or under a built-in sampling profiler, and
+reports stage timings recorded by the addon's tracer, split into network
+and parsing time.
+'''
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+
+from tracing import tracer
+from netstats import netstats
+
+
+NETWORK_STAGES = {
+    'sonaveeb.session',
+    'sonaveeb.searchwordfrag',
+    'sonaveeb.search_page',
+    'sonaveeb.details_page',
+    'sonaveeb.revalidate',
+    'gtranslate.request',
+    'audio.download',
+}
+PARSING_STAGES = {
+    'sonaveeb.html_parse',
+    'sonaveeb.extract',
+    'gtranslate.extract',
+}
+
+
+class Sampler:
+    '''Samples call stacks of the current thread at a fixed interval.'''
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._target = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path):
+        '''Write stacks in the collapsed format accepted by flamegraph tools.'''
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+    def print_stats(self, limit=30):
+        '''Print functions sorted by the number of samples they appeared in.'''
+        total = sum(self.stacks.values())
+        own = Counter()
+        cumulative = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                cumulative[frame] += count
+        print(f'{total} samples, {self.interval * 1000:.1f} ms interval')
+        print(f'{"cumulative":>10} {"own":>10}  function')
+        for frame, count in cumulative.most_common(limit):
+            print(f'{count / total:10.1%} {own[frame] / total:10.1%}  {frame}')
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+def add_arguments(parser):
+    group = parser.add_argument_group('profiling')
+    group.add_argument('--profile', nargs='?', const='cprofile', choices=['cprofile', 'sample'],
+                       help='Profile with cProfile (default) or the sampling profiler')
+    group.add_argument('--repeat', type=int, default=1, help='Number of times to run')
+    group.add_argument('--profile-out', default='profile',
+                       help='Output path prefix for .pstats (cprofile) or .collapsed (sample) files')
+    group.add_argument('--sort', default='cumulative', help='cProfile stats sort key')
+
+
+def run(func, args):
+    '''Run the function according to the command line arguments.
+
+    Returns:
+        The result of the last run.
+    '''
+    trace = tracer.begin('profile')
+    result = None
+    if args.profile == 'cprofile':
+        profiler = cProfile.Profile()
+        for _ in range(args.repeat):
+            result = profiler.runcall(func)
+        stats = pstats.Stats(profiler)
+        stats.sort_stats(args.sort).print_stats(30)
+        stats.dump_stats(f'{args.profile_out}.pstats')
+        print(f'Stats saved to {args.profile_out}.pstats')
+    elif args.profile == 'sample':
+        sampler = Sampler()
+        sampler.start()
+        try:
+            for _ in range(args.repeat):
+                result = func()
+        finally:
+            sampler.stop()
+        sampler.print_stats()
+        sampler.write_collapsed(f'{args.profile_out}.collapsed')
+        print(f'Collapsed stacks saved to {args.profile_out}.collapsed')
+    else:
+        for _ in range(args.repeat):
+            result = func()
+    tracer.finish()
+    if args.profile or args.repeat > 1:
+        print_stages(trace, args.repeat)
+    return result
+
+
+def print_stages(trace, repeat):
+    stages = trace.to_dict()['stages']
+    network = sum(s['total_ms'] for name, s in stages.items() if name in NETWORK_STAGES)
+    parsing = sum(s['total_ms'] for name, s in stages.items() if name in PARSING_STAGES)
+    print()
+    print(trace.summary())
+    print()
+    print(f'Network: {network / repeat:.1f} ms per run')
+    print(f'Parsing: {parsing / repeat:.1f} ms per run')
+    print()
+    print(netstats.summary())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+'''Re-parse cached Sõnaveeb pages with the current parser.
+
+Rebuilds the parsed-entry cache from the raw pages kept by the addon,
+using all CPU cores, and reports entries whose parsed output changed.
+Run it with Anki closed, since the addon saves the cache on exit.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+
+ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
+sys.path.append(ADDON_PATH)
+
+import bs4
+from cache import LookupCache, PageKind
+from sonaveeb import Sonaveeb, WordInfo, references_to_bytes, base_forms_to_bytes
+
+CACHE_PATH = os.path.join(ADDON_PATH, 'user_files', 'cache')
+
+# Scraper instance of a worker process, only its parsing methods are used
+_sonaveeb = None
+
+
+def _init_worker():
+    global _sonaveeb
+    _sonaveeb = Sonaveeb()
+
+
+def reparse(kind, url, content, old_entry):
+    '''Parse a page into a serialized entry.
+
+    Returns:
+        (url, entry) tuple.
+    '''
+    if kind == PageKind.FORMS:
+        data = json.loads(content)
+        return url, base_forms_to_bytes(data['prefWords'], data['formWords'])
+    dom = bs4.BeautifulSoup(content.decode('utf-8'), 'html.parser')
+    try:
+        if kind == PageKind.SEARCH:
+            return url, references_to_bytes(_sonaveeb._parse_search_results(dom))
+        info = _sonaveeb._parse_word_info(dom)
+    finally:
+        dom.decompose()
+    # Word ID comes from the search results when fetched, keep it
+    if old_entry is not None:
+        try:
+            info.word_id = WordInfo.from_bytes(old_entry).word_id
+        except ValueError:
+            pass
+    info.url = url
+    return url, info.to_bytes()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('Re-parse cached Sõnaveeb pages')
+    parser.add_argument('--cache-dir', default=CACHE_PATH, help='Addon lookup cache directory')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of processes')
+    parser.add_argument('--dry-run', action='store_true', help="Report changes, but don't save them")
+    args = parser.parse_args()
+
+    cache = LookupCache(args.cache_dir)
+    pages = cache.pages()
+    if not pages:
+        sys.exit(f'No cached pages in {args.cache_dir}')
+
+    started_at = time.perf_counter()
+    entries = {}
+    changed = []
+    failed = []
+    with concurrent.futures.ProcessPoolExecutor(args.workers, initializer=_init_worker) as executor:
+        futures = {}
+        for page in pages:
+            try:
+                content = cache.read_page(page)
+            except OSError as e:
+                failed.append((page.url, e))
+                continue
+            future = executor.submit(reparse, page.kind, page.url, content, cache.get_entry(page.url))
+            futures[future] = page.url
+        for future in concurrent.futures.as_completed(futures):
+            url = futures[future]
+            try:
+                _, entry = future.result()
+            except Exception as e:
+                failed.append((url, e))
+                continue
+            entries[url] = entry
+            if cache.get_entry(url) != entry:
+                changed.append(url)
+    elapsed = time.perf_counter() - started_at
+
+    for url in sorted(changed):
+        print(f'changed: {url}')
+    for url, error in failed:
+        print(f'failed: {url}: {error!r}')
+    print(f'{len(pages)} pages re-parsed in {elapsed:.1f} s with {args.workers} processes: '
+          f'{len(changed)} changed, {len(failed)} failed')
+    if not args.dry_run:
+        # Keep previous entries of pages that failed to parse
+        for url, _ in failed:
+            if (entry := cache.get_entry(url)) is not None:
+                entries[url] = entry
+        cache.replace_entries(entries)
+        cache.save()
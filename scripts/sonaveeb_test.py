@@ -9,6 +9,9 @@ ADDON_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'anki_addon')
 sys.path.append(ADDON_PATH)
 
 from sonaveeb import Sonaveeb, SonaveebMode
+from cache import LookupCache
+import http_fixtures
+import profiling
 
 
 if __name__ == '__main__':
@@ -19,10 +22,19 @@ if __name__ == '__main__':
                        default=Sonaveeb.DEFAULT_MODE.name,
                        choices=[m.name for m in SonaveebMode],
                        help='Sonaveeb mode to use')
+    parser.add_argument('--cache-dir', help='Use a lookup cache in this directory')
     parser.add_argument('--debug', action='store_true', help='Save HTML pages before parsing for debugging')
+    http_fixtures.add_arguments(parser)
+    profiling.add_arguments(parser)
     args = parser.parse_args()
 
-    sv = Sonaveeb()
+    cache = LookupCache(args.cache_dir) if args.cache_dir else None
+    sv = Sonaveeb(cache=cache)
     sv.set_mode(SonaveebMode[args.mode])
-    info = sv.get_word_info(args.word, debug=args.debug)
+    if http_fixtures.install(sv.session, args):
+        # Saved pages don't set the session cookie
+        sv.session.cookies.set('ww-sess', 'fixture')
+    info = profiling.run(lambda: sv.get_word_info(args.word, debug=args.debug), args)
     pprint.pp(info)
+    if cache is not None:
+        cache.save()